@@ -28,58 +28,246 @@ and can be solved exactly using interior-point methods.
 Usage:
     echo '{"n_agents": 3, "n_resources": 2, ...}' | python3 joint_solver.py
     
+    python3 joint_solver.py --daemon
+        Reads one JSON request per line and writes one JSON response per
+        line until stdin closes, keeping the interpreter, the imports and
+        the cached problems alive across requests.
+    
 Requirements:
-    pip install cvxpy clarabel numpy
+    pip install "cvxpy>=1.9" "clarabel>=0.10" numpy
 
 Author: CARMA Arbitration Platform
 """
 
+import os
 import sys
 import json
+import functools
+import importlib.util
 import numpy as np
 
+# cvxpy is imported on first use by load_cvxpy(); only its presence is
+# checked here
+cp = None
+CVXPY_AVAILABLE = importlib.util.find_spec('cvxpy') is not None
+
 try:
-    import cvxpy as cp
-    CVXPY_AVAILABLE = True
+    import scipy.sparse as sp
+    import clarabel
+    CLARABEL_AVAILABLE = True
 except ImportError:
-    CVXPY_AVAILABLE = False
+    CLARABEL_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Solvers in order of preference. Clarabel handles every cone the problem
+# needs (exponential for the log objective, power/SOC for CES and sqrt).
+# OSQP is deliberately absent: the log objective is never a QP.
+SOLVER_ORDER = ['CLARABEL', 'ECOS', 'SCS']
+
+# Clarabel stopping criteria, shared by the native linear path and CVXPY.
+# Allocations do not need Clarabel's default 1e-8 gap and feasibility, which
+# cost a few extra interior-point iterations per solve, and hitting the
+# iteration cap falls through to the next solver. The infeasibility
+# tolerances are left at Clarabel's defaults, so a marginal instance is not
+# certified infeasible early. CARMA_CLARABEL_TOL=1e-8 and
+# CARMA_CLARABEL_MAX_ITER=200 restore the defaults.
+CLARABEL_TOL = float(os.environ.get('CARMA_CLARABEL_TOL') or 1e-6)
+CLARABEL_MAX_ITER = int(os.environ.get('CARMA_CLARABEL_MAX_ITER') or 50)
+CLARABEL_SETTINGS = {
+    'tol_gap_abs': CLARABEL_TOL,
+    'tol_gap_rel': CLARABEL_TOL,
+    'tol_feas': CLARABEL_TOL,
+    'max_iter': CLARABEL_MAX_ITER,
+}
+
+# Extra keyword arguments passed to problem.solve() per solver
+SOLVER_OPTIONS = {
+    'CLARABEL': CLARABEL_SETTINGS,
+}
+
+# Canonicalization backend override (e.g. 'SCIPY', 'CPP'). Unset lets CVXPY
+# pick, which is the fastest choice for this problem family on CVXPY 1.9.
+CANON_BACKEND = os.environ.get('CARMA_CANON_BACKEND') or None
+
+# Threads the CPP canonicalization backend may use to build the per-agent
+# constraint matrices. Defaults to every core; set to 1 to stay serial.
+CANON_THREADS = int(os.environ.get('CARMA_CANON_THREADS') or os.cpu_count() or 1)
+
+# SOLVER_ORDER restricted to the solvers actually installed, detected once by
+# load_cvxpy so that a missing one is not attempted (and failed) on every solve
+INSTALLED_SOLVERS = []
+
+# problem.status values (cvxpy.settings) that end the solver fail-over: a
+# usable solution, or a certificate that the remaining solvers would only
+# confirm
+SOLVED_STATUSES = frozenset(['optimal', 'optimal_inaccurate'])
+CERTIFIED_STATUSES = frozenset(['infeasible', 'unbounded'])
+
+# Reuse solver state from the cached problem's previous solve: Clarabel
+# updates its solver object in place instead of re-allocating, SCS restarts
+# from the prior iterate (A.value). CARMA_WARMSTART=0 makes every solve cold.
+WARM_START = os.environ.get('CARMA_WARMSTART', '1') != '0'
+
+# problem.solve() keyword arguments per installed solver, assembled once by
+# load_cvxpy
+SOLVE_KWARGS = {}
+
+
+# ============================================================================
+# Deferred CVXPY Import
+# ============================================================================
+
+def load_cvxpy():
+    """
+    Import cvxpy on first use and finish the solver setup that depends on it.
+    
+    cvxpy's import dominates a cold start (most of a second), while the
+    native Clarabel path for all-linear agents and the sequential fallback
+    never build a CVXPY problem. A cvxpy that is installed but fails to
+    import (e.g. a broken compiled extension) clears CVXPY_AVAILABLE before
+    the ImportError propagates, so solve_request falls back as it does when
+    cvxpy is missing.
+    """
+    global cp, CVXPY_AVAILABLE
+    if cp is None:
+        try:
+            import cvxpy
+        except ImportError:
+            CVXPY_AVAILABLE = False
+            raise
+        cvxpy.set_num_threads(CANON_THREADS)
+        installed = cvxpy.installed_solvers()
+        INSTALLED_SOLVERS.extend(name for name in SOLVER_ORDER if name in installed)
+        SOLVE_KWARGS.update(
+            (name, dict(solver=name, verbose=False, warm_start=WARM_START,
+                        canon_backend=CANON_BACKEND, **SOLVER_OPTIONS.get(name, {})))
+            for name in INSTALLED_SOLVERS
+        )
+        cp = cvxpy
+    return cp
+
+
+# ============================================================================
+# Optional JIT Compilation
+# ============================================================================
+
+def lazy_njit(fallback=None, **options):
+    """
+    Decorator compiling a numeric kernel with numba.njit(**options) on its
+    first call. Deferred so solves that never reach a kernel skip Numba's
+    import cost; without Numba the kernel runs as plain Python, or as
+    `fallback` when one is given (e.g. a vectorized NumPy version).
+    """
+    def decorate(func):
+        compiled = None
+        
+        @functools.wraps(func)
+        def wrapper(*args):
+            nonlocal compiled
+            if compiled is None:
+                try:
+                    from numba import njit
+                    compiled = njit(**options)(func)
+                except ImportError:
+                    compiled = fallback or func
+            return compiled(*args)
+        return wrapper
+    return decorate
+
+
+# ============================================================================
+# Resource Index Resolution
+# ============================================================================
+
+def resolve_indices(weights, res_to_idx, reference_points=None):
+    """
+    Resolve a {resource_name: weight} mapping against the resource index.
+    
+    Returns (idx, weights, refs) as aligned numpy arrays; names that are not
+    in res_to_idx are dropped and missing reference points default to 0.
+    """
+    reference_points = reference_points or {}
+    names = [name for name in weights if name in res_to_idx]
+    idx = np.array([res_to_idx[name] for name in names], dtype=int)
+    weight_arr = np.array([weights[name] for name in names], dtype=float)
+    ref_arr = np.array([reference_points.get(name, 0.0) for name in names], dtype=float)
+    return idx, weight_arr, ref_arr
 
 
 # ============================================================================
 # Utility Function Implementations (CVXPY expressions)
 # ============================================================================
+#
+# The basic utility families take W and A restricted to the agents of
+# interest: either one agent's row (shape (m,)) or a block of rows (shape
+# (k, m)). Sums run over the last axis, so a block yields a length-k vector
+# and a whole group of same-type agents becomes a single expression.
+
+def weighted_row_sum(W, X):
+    """
+    Σⱼ wⱼ·xⱼ for each row: one inner-product atom for a single row,
+    multiply + sum over the last axis for a block.
+    """
+    if X.ndim == 1:
+        return W @ X
+    return cp.sum(cp.multiply(W, X), axis=-1)
 
-def compute_linear_utility(W, A, agent_idx):
+
+def power_terms(X, p):
+    """
+    X^p elementwise through the cheapest cone for the exponent.
+    
+    p = ½, 2 and -1 are √X, X² and 1/X (one SOC per entry); other quarter
+    exponents need only two or three SOCs. Any other p would become a long
+    rational SOC chain, so it uses one 3D power cone per entry instead.
+    """
+    if abs(p - 0.5) < 1e-3:
+        return cp.sqrt(X)
+    if abs(p - 2.0) < 1e-3:
+        return cp.square(X)
+    if abs(p + 1.0) < 1e-3:
+        return cp.inv_pos(X)
+    if float(4 * p).is_integer():
+        return cp.power(X, p)
+    return cp.power(X, p, approx=False)
+
+
+def compute_linear_utility(W, A):
     """Linear utility: Φ = Σⱼ wⱼ·aⱼ"""
-    return cp.sum(cp.multiply(W[agent_idx, :], A[agent_idx, :]))
+    return weighted_row_sum(W, A)
 
 
-def compute_sqrt_utility(W, A, agent_idx, epsilon=1e-6):
+def compute_sqrt_utility(W, A, epsilon=1e-6):
     """Square root utility: Φ = (Σⱼ wⱼ·√aⱼ)²"""
-    sqrt_terms = cp.sqrt(A[agent_idx, :] + epsilon)
-    weighted_sum = cp.sum(cp.multiply(W[agent_idx, :], sqrt_terms))
+    sqrt_terms = cp.sqrt(A + epsilon)
+    weighted_sum = weighted_row_sum(W, sqrt_terms)
     return cp.square(weighted_sum)
 
 
-def compute_log_utility(W, A, agent_idx, epsilon=1e-6):
+def compute_log_utility(W, A, epsilon=1e-6):
     """Logarithmic utility: Φ = Σⱼ wⱼ·log(1+aⱼ)"""
-    log_terms = cp.log(1 + A[agent_idx, :] + epsilon)
-    return cp.sum(cp.multiply(W[agent_idx, :], log_terms))
+    log_terms = cp.log(1 + A + epsilon)
+    return weighted_row_sum(W, log_terms)
 
 
-def compute_cobb_douglas_utility(W, A, agent_idx, epsilon=1e-6):
+def compute_cobb_douglas_utility(W, A, epsilon=1e-6):
     """
     Cobb-Douglas utility: Φ = Π aⱼ^wⱼ
     
     We use log transformation: log(Φ) = Σⱼ wⱼ·log(aⱼ)
     Then Φ = exp(Σⱼ wⱼ·log(aⱼ))
     """
-    log_terms = cp.log(A[agent_idx, :] + epsilon)
-    weighted_log_sum = cp.sum(cp.multiply(W[agent_idx, :], log_terms))
+    log_terms = cp.log(A + epsilon)
+    weighted_log_sum = weighted_row_sum(W, log_terms)
     return cp.exp(weighted_log_sum)
 
 
-def compute_ces_utility(W, A, agent_idx, rho, epsilon=1e-6):
+def compute_ces_utility(W, A, rho, epsilon=1e-6):
     """
     CES utility: Φ = (Σⱼ wⱼ·aⱼ^ρ)^(1/ρ)
     
@@ -90,19 +278,49 @@ def compute_ces_utility(W, A, agent_idx, rho, epsilon=1e-6):
         ρ → -∞: Leontief
     """
     if abs(rho - 1.0) < 0.01:
-        return compute_linear_utility(W, A, agent_idx)
+        return compute_linear_utility(W, A)
     
     if abs(rho) < 0.01:
-        return compute_cobb_douglas_utility(W, A, agent_idx, epsilon)
+        return compute_cobb_douglas_utility(W, A, epsilon)
     
     if rho < -10:
         # Leontief approximation - use geometric mean as smooth approximation
-        return compute_cobb_douglas_utility(W, A, agent_idx, epsilon)
+        return compute_cobb_douglas_utility(W, A, epsilon)
     
     # General CES case
-    power_terms = cp.power(A[agent_idx, :] + epsilon, rho)
-    weighted_sum = cp.sum(cp.multiply(W[agent_idx, :], power_terms))
-    return cp.power(weighted_sum, 1.0 / rho)
+    weighted_sum = weighted_row_sum(W, power_terms(A + epsilon, rho))
+    return power_terms(weighted_sum, 1.0 / rho)
+
+
+def compute_log_phi(util_type, W, A, A_safe, rho=None):
+    """
+    log(Φ) for a basic utility family, built directly in log-space.
+    
+    A_safe is A + ε, formed once by the caller and shared by every family
+    that needs strictly positive arguments.
+    
+    The objective only ever needs log(Φ), so the outer square/exp/power
+    that would be undone by the log are dropped. This keeps every family
+    concave (DCP) and saves one atom per agent:
+        SQRT:          log(Φ) = 2·log(Σⱼ wⱼ·√aⱼ)
+        COBB_DOUGLAS:  log(Φ) = Σⱼ wⱼ·log(aⱼ)
+        CES (0<ρ<1):   log(Φ) = (1/ρ)·log(Σⱼ wⱼ·aⱼ^ρ)
+        LINEAR, LOG:   log(Φ)
+    """
+    if util_type == 'SQRT':
+        return 2 * cp.log(weighted_row_sum(W, cp.sqrt(A_safe)))
+    
+    if util_type == 'LOG':
+        return cp.log(weighted_row_sum(W, cp.log(1 + A_safe)))
+    
+    if util_type == 'COBB_DOUGLAS' or (
+            util_type == 'CES' and (abs(rho) < 0.01 or rho < -10)):
+        return weighted_row_sum(W, cp.log(A_safe))
+    
+    if util_type == 'CES' and abs(rho - 1.0) >= 0.01:
+        return (1.0 / rho) * cp.log(weighted_row_sum(W, power_terms(A_safe, rho)))
+    
+    return cp.log(compute_linear_utility(W, A))
 
 
 def compute_threshold_utility(W, A, agent_idx, config, epsilon=1e-6):
@@ -110,31 +328,35 @@ def compute_threshold_utility(W, A, agent_idx, config, epsilon=1e-6):
     Threshold utility: Φ = σ(Σaⱼ - T) · Φ_base
     where σ(x) = 1/(1 + e^(-k·x)) is a soft sigmoid
     
-    For DCP compliance, we approximate using a smooth function.
+    Built as exp(log Φ); see compute_log_threshold_utility for the DCP form.
+    """
+    return cp.exp(compute_log_threshold_utility(W, A, agent_idx, config, epsilon))
+
+
+def compute_log_threshold_utility(W, A, agent_idx, config, epsilon=1e-6):
+    """
+    log of the threshold utility:
+        log Φ = log Φ_base + log σ(z) = log Φ_base - logistic(-z)
+    with z = k·(Σaⱼ - T). logistic(-z) is convex in the allocation, so
+    unlike the product σ(z)·Φ_base this is concave (DCP) for any base
+    utility whose log(Φ_base) is.
     """
     threshold = config.get('threshold', 50.0)
     sharpness = config.get('sharpness', 1.0)
     base_config = config.get('base_utility', {'type': 'LINEAR'})
+    base_type = base_config.get('type', 'LINEAR')
+    rho = base_config.get('rho', 0.5)
+    
+    # Basic base utilities go straight to log-space
+    W_i, A_i = W[agent_idx, :], A[agent_idx, :]
+    if base_type in ['LINEAR', 'SQRT', 'LOG', 'COBB_DOUGLAS'] or (
+            base_type == 'CES' and 0 < rho < 1):
+        log_base = compute_log_phi(base_type, W_i, A_i, A_i + epsilon, rho)
+    else:
+        log_base = cp.log(get_utility_for_agent(W, A, agent_idx, base_config, epsilon))
     
-    # Compute base utility
-    base_util = get_utility_for_agent(W, A, agent_idx, base_config, epsilon)
-    
-    # Compute total allocation
-    total_alloc = cp.sum(A[agent_idx, :])
-    
-    # Sigmoid approximation using logistic function
-    # σ(k(x-T)) ≈ 1 - 1/(1 + exp(k(x-T)))
-    # For DCP, we use a soft approximation
-    sigmoid_arg = sharpness * (total_alloc - threshold)
-    
-    # Use log_sum_exp for numerical stability: σ(x) = exp(x) / (1 + exp(x))
-    # This is concave in the allocation, so threshold * base is still tractable
-    # We approximate by using the base utility scaled by a smooth step
-    # For large positive sigmoid_arg, result approaches base_util
-    # For large negative sigmoid_arg, result approaches 0
-    
-    # Approximation: use soft minimum between base_util and scaled version
-    return base_util * cp.inv_pos(1 + cp.exp(-sigmoid_arg))
+    sigmoid_arg = sharpness * (cp.sum(A_i) - threshold)
+    return log_base - cp.logistic(-sigmoid_arg)
 
 
 def compute_satiation_utility(W, A, agent_idx, config, epsilon=1e-6):
@@ -142,6 +364,9 @@ def compute_satiation_utility(W, A, agent_idx, config, epsilon=1e-6):
     Satiation utility:
     - Exponential: Φ = V_max · (1 - e^(-Φ_base/k))
     - Hyperbolic: Φ = V_max · Φ_base / (k + Φ_base)
+    
+    The hyperbolic form avoids exponential-cone constraints and is the
+    cheaper choice for the solver when either shape is acceptable.
     """
     max_utility = config.get('max_utility', 100.0)
     saturation_param = config.get('saturation_param', 10.0)
@@ -151,16 +376,18 @@ def compute_satiation_utility(W, A, agent_idx, config, epsilon=1e-6):
     base_util = get_utility_for_agent(W, A, agent_idx, base_config, epsilon)
     
     if hyperbolic:
-        # Φ = V_max · Φ_base / (k + Φ_base)
-        # This is concave in Φ_base when Φ_base > 0
-        return max_utility * base_util / (saturation_param + base_util + epsilon)
+        # Φ = V_max · Φ_base / (k + Φ_base) = V_max · (1 - k / (k + Φ_base))
+        # Written with inv_pos so it is DCP (concave for concave Φ_base) and
+        # canonicalizes to second-order cones rather than the exponential cone
+        k = saturation_param + epsilon
+        return max_utility - max_utility * k * cp.inv_pos(k + base_util)
     else:
         # Φ = V_max · (1 - e^(-Φ_base/k))
         # This is concave and increasing in Φ_base
         return max_utility * (1 - cp.exp(-base_util / saturation_param))
 
 
-def compute_nested_ces_utility(W, A, agent_idx, config, resource_names, epsilon=1e-6):
+def compute_nested_ces_utility(W, A, agent_idx, config, res_to_idx, epsilon=1e-6):
     """
     Nested CES utility with hierarchical substitution patterns.
     
@@ -174,32 +401,23 @@ def compute_nested_ces_utility(W, A, agent_idx, config, resource_names, epsilon=
     
     if not nests:
         # Fallback to linear
-        return compute_linear_utility(W, A, agent_idx)
-    
-    # Build resource name to index mapping
-    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
+        return compute_linear_utility(W[agent_idx, :], A[agent_idx, :])
     
     # Compute each nest value
     nest_values = []
     for nest_idx, nest in enumerate(nests):
         rho = nest_rhos[nest_idx] if nest_idx < len(nest_rhos) else 0.5
+        idx, weights, _ = resolve_indices(nest, res_to_idx)
+        A_nest = A[agent_idx, idx] + epsilon if idx.size else None
         
         if abs(rho) < 0.01:
             # Cobb-Douglas for this nest
-            log_sum = 0
-            for res_name, weight in nest.items():
-                if res_name in res_to_idx:
-                    j = res_to_idx[res_name]
-                    log_sum = log_sum + weight * cp.log(A[agent_idx, j] + epsilon)
+            log_sum = weights @ cp.log(A_nest) if idx.size else 0
             nest_values.append(cp.exp(log_sum))
         else:
             # CES for this nest
-            power_sum = 0
-            for res_name, weight in nest.items():
-                if res_name in res_to_idx:
-                    j = res_to_idx[res_name]
-                    power_sum = power_sum + weight * cp.power(A[agent_idx, j] + epsilon, rho)
-            nest_values.append(cp.power(power_sum + epsilon, 1.0 / rho))
+            power_sum = weights @ power_terms(A_nest, rho) if idx.size else 0
+            nest_values.append(power_terms(power_sum + epsilon, 1.0 / rho))
     
     # Combine nests with outer CES
     if abs(outer_rho) < 0.01:
@@ -214,11 +432,11 @@ def compute_nested_ces_utility(W, A, agent_idx, config, resource_names, epsilon=
         power_sum = 0
         for i, nv in enumerate(nest_values):
             alpha = nest_weights[i] if i < len(nest_weights) else 1.0 / len(nest_values)
-            power_sum = power_sum + alpha * cp.power(nv + epsilon, outer_rho)
-        return cp.power(power_sum + epsilon, 1.0 / outer_rho)
+            power_sum = power_sum + alpha * power_terms(nv + epsilon, outer_rho)
+        return power_terms(power_sum + epsilon, 1.0 / outer_rho)
 
 
-def compute_softplus_loss_aversion_utility(W, A, agent_idx, config, resource_names, epsilon=1e-6):
+def compute_softplus_loss_aversion_utility(W, A, agent_idx, config, res_to_idx, epsilon=1e-6):
     """
     Softplus Loss Aversion (Constraint Set 3):
     
@@ -227,40 +445,67 @@ def compute_softplus_loss_aversion_utility(W, A, agent_idx, config, resource_nam
     
     This is globally concave when λ > 1.
     """
-    reference_points = config.get('reference_points', {})
     lambda_param = config.get('lambda', 2.0)
     tau = config.get('tau', 1.0)
     
-    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
+    idx, weights, refs = resolve_indices(
+        config.get('weights', {}), res_to_idx, config.get('reference_points', {}))
+    if not idx.size:
+        return 0
     
-    utility = 0
-    for res_name, weight in config.get('weights', {}).items():
-        if res_name not in res_to_idx:
-            continue
-        j = res_to_idx[res_name]
-        ref = reference_points.get(res_name, 0.0)
-        
-        # x = a_j - r_j
-        x = A[agent_idx, j] - ref
-        
-        # g(x) = x - (λ - 1) · τ · ln(1 + exp(-x / τ))
-        # Using log_sum_exp for stability: ln(1 + exp(-x/τ)) = softplus(-x/τ)
-        # softplus(y) = log(1 + exp(y)) which is convex
-        # So -softplus(-x/τ) = -log(1 + exp(-x/τ)) is concave
-        
-        # g(x) = x - (λ-1)·τ·softplus(-x/τ)
-        # Since softplus is convex, -softplus is concave
-        # x is linear (concave), so g(x) is concave when λ > 1
-        
-        softplus_term = cp.logistic(-x / tau) * tau  # τ·log(1 + exp(-x/τ))
-        g_x = x - (lambda_param - 1) * softplus_term
-        
-        utility = utility + weight * g_x
+    # x = a_j - r_j
+    x = A[agent_idx, idx] - refs
+    
+    # g(x) = x - (λ-1)·τ·softplus(-x/τ)
+    # softplus(y) = log(1 + exp(y)) is convex, so -softplus is concave;
+    # x is linear (concave), so g(x) is concave when λ > 1
+    softplus_term = cp.logistic(-x / tau) * tau  # τ·log(1 + exp(-x/τ))
+    g_x = x - (lambda_param - 1) * softplus_term
     
-    return utility
+    return weights @ g_x
 
 
-def compute_asymmetric_log_loss_aversion_utility(W, A, agent_idx, config, resource_names, epsilon=1e-6):
+def compute_softplus_loss_aversion_block(A, rows, utility_configs, res_to_idx):
+    """
+    Softplus loss aversion for a block of agents as one vector expression.
+    
+    Every agent's resolved (resource, reference) terms are gathered into a
+    flat vector x = a - r, transformed with a single logistic atom and
+    summed back per agent through a constant selection matrix S:
+        Φ = S · (w ⊙ g(x))
+    """
+    owners, cells, weights, refs, lambdas, taus = [], [], [], [], [], []
+    for k, i in enumerate(rows):
+        config = utility_configs[i]
+        idx, w_k, r_k = resolve_indices(
+            config.get('weights', {}), res_to_idx, config.get('reference_points', {}))
+        lambda_param, tau = loss_aversion_params(config, 'SOFTPLUS_LOSS_AVERSION')
+        owners.append(np.full(idx.size, k))
+        cells.append(np.full(idx.size, i) * A.shape[1] + idx)
+        weights.append(w_k)
+        refs.append(r_k)
+        lambdas.append(np.full(idx.size, lambda_param))
+        taus.append(np.full(idx.size, tau))
+    
+    owners = np.concatenate(owners)
+    n_terms = owners.size
+    if not n_terms:
+        return np.zeros(len(rows))
+    
+    # x = a - r over every term; row-major cell ids index the flattened A
+    x = cp.vec(A, order='C')[np.concatenate(cells)] - np.concatenate(refs)
+    taus = np.concatenate(taus)
+    
+    # g(x) = x - (λ-1)·τ·softplus(-x/τ), with per-term λ and τ
+    g_x = x - cp.multiply((np.concatenate(lambdas) - 1) * taus,
+                          cp.logistic(cp.multiply(-1.0 / taus, x)))
+    
+    S = sp.csr_matrix((np.ones(n_terms), (owners, np.arange(n_terms))),
+                      shape=(len(rows), n_terms))
+    return S @ cp.multiply(np.concatenate(weights), g_x)
+
+
+def compute_asymmetric_log_loss_aversion_utility(W, A, agent_idx, config, res_to_idx, epsilon=1e-6):
     """
     Asymmetric Log Loss Aversion (Constraint Set 5):
     
@@ -270,163 +515,146 @@ def compute_asymmetric_log_loss_aversion_utility(W, A, agent_idx, config, resour
     
     For DCP compliance, we use a smooth approximation that's concave.
     """
-    reference_points = config.get('reference_points', {})
     lambda_param = max(1.0, config.get('lambda', 2.0))
     kappa = max(epsilon, config.get('kappa', 10.0))
+    weights_cfg = config.get('weights', {})
     
-    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
+    # Add offset to ensure positive utility
+    offset = len(weights_cfg) * lambda_param * np.log(1 + 1)
     
-    utility = 0
-    for res_name, weight in config.get('weights', {}).items():
-        if res_name not in res_to_idx:
-            continue
-        j = res_to_idx[res_name]
-        ref = reference_points.get(res_name, 0.0)
-        
-        # x = a_j - r_j
-        x = A[agent_idx, j] - ref
-        
-        # Smooth approximation of the piecewise function
-        # We use: g(x) ≈ (1/2)[ln(1 + x/κ) - λ·ln(1 + |x|/κ)] + (1/2)[ln(1 + x/κ) + λ·ln(1 + |x|/κ)]·sign(x)
-        # 
-        # Simpler smooth approximation using softplus blending:
-        # For x >> 0: g(x) → ln(1 + x/κ)
-        # For x << 0: g(x) → -λ·ln(1 - x/κ) = -λ·ln(1 + |x|/κ)
-        
-        # Use smooth max/min for blending
-        # g(x) = ln(1 + x/κ) · σ(x/τ) - λ·ln(1 + (-x)/κ) · σ(-x/τ)
-        # where τ is a small temperature
-        
-        # For DCP, approximate with concave upper bound:
-        # Both ln(1 + x/κ) for x > 0 and -λ·ln(1 + |x|/κ) for x < 0 are concave
-        # We can use a smooth blend
-        
-        tau_blend = kappa / 10  # Temperature for blending
-        
-        # Positive part: ln(1 + max(x,0)/κ) ≈ ln(1 + softplus(x)/κ) for smooth
-        # Negative part: -λ·ln(1 + max(-x,0)/κ) ≈ -λ·ln(1 + softplus(-x)/κ)
-        
-        # Simplified concave approximation:
-        # g(x) ≈ ln(1 + (x + κ)/κ) - λ·ln(1 + (-x + κ)/κ) + constant adjustment
-        # This isn't exact but preserves concavity
-        
-        # Better approach: use the fact that for the optimizer, 
-        # we care about gradients. Use piecewise linear at reference as approximation
-        # slope right of ref: 1/κ, slope left of ref: λ/κ
-        
-        # For convex optimization, we use the concave envelope:
-        # This is achieved by the minimum of tangent lines
-        # At x = 0: slope transitions from λ/κ to 1/κ
-        
-        # Simple DCP-compliant version using log:
-        pos_term = cp.log(1 + (x + epsilon) / kappa)  # Concave
-        neg_term = cp.log(1 + (-x + epsilon) / kappa)  # Concave in -x, so convex in x
-        
-        # Blend using smooth step
-        # σ(x) = 1/(1 + exp(-x/τ)) ≈ (x/τ + 1)/2 for small τ
-        # For DCP, we use: g(x) = pos_term when x > 0, -λ·neg_term when x < 0
-        # Smooth version: g(x) = pos_term - λ·neg_term + (λ-1)·neg_term·σ(x)
-        
-        # Actually, for strict DCP compliance, use the simpler bound:
-        # g(x) ≤ pos_term (upper bound for x > 0)
-        # g(x) ≤ -λ·neg_term (upper bound for x < 0)
-        # Combined: g(x) ≤ min(pos_term, -λ·neg_term) but min isn't DCP for maximization
-        
-        # Use weighted sum as approximation (not exact but concave):
-        # This underestimates near zero but is globally concave
-        weight_pos = 0.5 + 0.5 * cp.tanh(x / tau_blend) / 2  # Not DCP...
-        
-        # Fall back to simpler linear approximation for DCP
-        # g(x) ≈ (1/κ)·x for gains, (λ/κ)·x for losses
-        # Smooth: g(x) ≈ x/κ · [1 + (λ-1)·σ(-x)]
-        # But this still isn't DCP...
-        
-        # Most reliable DCP approach: use pos_term for entire domain
-        # This is a conservative approximation (underestimates loss aversion)
-        g_x = pos_term - lambda_param * neg_term
-        
-        utility = utility + weight * g_x
+    idx, weights, refs = resolve_indices(
+        weights_cfg, res_to_idx, config.get('reference_points', {}))
+    if not idx.size:
+        return offset
     
-    # Add offset to ensure positive utility
-    return utility + len(config.get('weights', {})) * lambda_param * np.log(1 + 1)
+    # x = a_j - r_j
+    x = A[agent_idx, idx] - refs
+    
+    # Both ln(1 + x/κ) for x > 0 and -λ·ln(1 + |x|/κ) for x < 0 are concave
+    # on their own half-line; a min() blend is not DCP for maximization.
+    # Conservative approximation (underestimates loss aversion near the
+    # reference point): combine both log branches over the whole domain.
+    pos_term = cp.log(1 + (x + epsilon) / kappa)
+    neg_term = cp.log(1 + (-x + epsilon) / kappa)
+    g_x = pos_term - lambda_param * neg_term
+    
+    return weights @ g_x + offset
 
 
-def get_utility_for_agent(W, A, agent_idx, utility_config, epsilon=1e-6, resource_names=None):
+def get_utility_for_agent(W, A, agent_idx, utility_config, epsilon=1e-6, res_to_idx=None):
     """
     Get the utility expression for a specific agent based on their utility config.
     """
+    W_i, A_i = W[agent_idx, :], A[agent_idx, :]
+    
     if utility_config is None:
-        return compute_linear_utility(W, A, agent_idx)
+        return compute_linear_utility(W_i, A_i)
     
     util_type = utility_config.get('type', 'LINEAR')
     
     if util_type == 'LINEAR':
-        return compute_linear_utility(W, A, agent_idx)
+        return compute_linear_utility(W_i, A_i)
     elif util_type == 'SQRT':
-        return compute_sqrt_utility(W, A, agent_idx, epsilon)
+        return compute_sqrt_utility(W_i, A_i, epsilon)
     elif util_type == 'LOG':
-        return compute_log_utility(W, A, agent_idx, epsilon)
+        return compute_log_utility(W_i, A_i, epsilon)
     elif util_type == 'COBB_DOUGLAS':
-        return compute_cobb_douglas_utility(W, A, agent_idx, epsilon)
+        return compute_cobb_douglas_utility(W_i, A_i, epsilon)
     elif util_type == 'CES':
         rho = utility_config.get('rho', 0.5)
-        return compute_ces_utility(W, A, agent_idx, rho, epsilon)
+        return compute_ces_utility(W_i, A_i, rho, epsilon)
     elif util_type == 'LEONTIEF':
         # Approximate with low-rho CES
-        return compute_ces_utility(W, A, agent_idx, -5.0, epsilon)
+        return compute_ces_utility(W_i, A_i, -5.0, epsilon)
     elif util_type == 'THRESHOLD':
         return compute_threshold_utility(W, A, agent_idx, utility_config, epsilon)
     elif util_type == 'SATIATION':
         return compute_satiation_utility(W, A, agent_idx, utility_config, epsilon)
     elif util_type == 'NESTED_CES':
-        if resource_names is None:
-            return compute_linear_utility(W, A, agent_idx)
-        return compute_nested_ces_utility(W, A, agent_idx, utility_config, resource_names, epsilon)
+        if res_to_idx is None:
+            return compute_linear_utility(W_i, A_i)
+        return compute_nested_ces_utility(W, A, agent_idx, utility_config, res_to_idx, epsilon)
     elif util_type == 'SOFTPLUS_LOSS_AVERSION':
-        if resource_names is None:
-            return compute_linear_utility(W, A, agent_idx)
-        return compute_softplus_loss_aversion_utility(W, A, agent_idx, utility_config, resource_names, epsilon)
+        if res_to_idx is None:
+            return compute_linear_utility(W_i, A_i)
+        return compute_softplus_loss_aversion_utility(W, A, agent_idx, utility_config, res_to_idx, epsilon)
     elif util_type == 'ASYMMETRIC_LOG_LOSS_AVERSION':
-        if resource_names is None:
-            return compute_linear_utility(W, A, agent_idx)
-        return compute_asymmetric_log_loss_aversion_utility(W, A, agent_idx, utility_config, resource_names, epsilon)
+        if res_to_idx is None:
+            return compute_linear_utility(W_i, A_i)
+        return compute_asymmetric_log_loss_aversion_utility(W, A, agent_idx, utility_config, res_to_idx, epsilon)
     else:
-        return compute_linear_utility(W, A, agent_idx)
+        return compute_linear_utility(W_i, A_i)
 
 
 # ============================================================================
 # Numpy Utility Evaluation (for result reporting)
 # ============================================================================
+#
+# As with the CVXPY builders, the basic evaluators accept one agent's row or
+# a (k, m) block of rows and reduce over the last axis.
+
+def weighted_row_sum_np(w, x):
+    """
+    Σⱼ wⱼ·xⱼ over the last axis as one einsum, which reduces the products
+    as it forms them instead of materializing w * x first.
+    """
+    return np.einsum('...j,...j->...', w, x)
+
+
+def log_welfare(c, utilities, floor):
+    """
+    Σᵢ cᵢ·log(max(uᵢ, floor)) with a single scratch array: the clamp and
+    the log run in place and the weighted sum is a dot product.
+    """
+    u = np.maximum(utilities, floor)
+    np.log(u, out=u)
+    return float(c @ u)
+
 
 def eval_linear_utility_np(w, a):
     """Evaluate linear utility with numpy."""
-    return np.sum(w * a)
+    return weighted_row_sum_np(w, a)
 
 
 def eval_sqrt_utility_np(w, a, epsilon=1e-6):
     """Evaluate sqrt utility with numpy."""
     sqrt_terms = np.sqrt(np.maximum(a, epsilon))
-    return np.sum(w * sqrt_terms) ** 2
+    return weighted_row_sum_np(w, sqrt_terms) ** 2
 
 
 def eval_log_utility_np(w, a, epsilon=1e-6):
     """Evaluate log utility with numpy."""
-    return np.sum(w * np.log(1 + a + epsilon))
+    return weighted_row_sum_np(w, np.log(1 + a + epsilon))
 
 
 def eval_cobb_douglas_utility_np(w, a, epsilon=1e-6):
     """Evaluate Cobb-Douglas utility with numpy."""
-    return np.prod(np.maximum(a, epsilon) ** w)
+    return np.prod(np.maximum(a, epsilon) ** w, axis=-1)
 
 
 def eval_ces_utility_np(w, a, rho, epsilon=1e-6):
-    """Evaluate CES utility with numpy."""
-    if abs(rho - 1.0) < 0.01:
-        return eval_linear_utility_np(w, a)
-    if abs(rho) < 0.01:
-        return eval_cobb_douglas_utility_np(w, a, epsilon)
-    power_terms = np.maximum(a, epsilon) ** rho
-    return np.sum(w * power_terms) ** (1.0 / rho)
+    """
+    Evaluate CES utility with numpy.
+    
+    rho is a scalar, or for a block of agents one value per row.
+    """
+    rho = np.asarray(rho, dtype=float)
+    is_linear = np.abs(rho - 1.0) < 0.01
+    is_cobb_douglas = np.abs(rho) < 0.01
+    # Special-case rows get a placeholder exponent so the power terms stay finite
+    safe_rho = np.where(is_linear | is_cobb_douglas, 1.0, rho)
+    powered = np.maximum(a, epsilon) ** safe_rho[..., None]
+    ces = weighted_row_sum_np(w, powered) ** (1.0 / safe_rho)
+    result = np.where(is_linear, eval_linear_utility_np(w, a),
+                      np.where(is_cobb_douglas, eval_cobb_douglas_utility_np(w, a, epsilon), ces))
+    return result[()]
+
+
+def eval_leontief_utility_np(w, a):
+    """Evaluate Leontief utility with numpy: Φ = minⱼ aⱼ/wⱼ over wⱼ > 0."""
+    mask = w > 1e-8
+    ratios = np.where(mask, a / np.where(mask, w, 1.0), np.inf)
+    return np.where(np.any(mask, axis=-1), np.min(ratios, axis=-1), 0.0)[()]
 
 
 def sigmoid(x):
@@ -436,257 +664,374 @@ def sigmoid(x):
                     np.exp(x) / (1 + np.exp(x)))
 
 
-def eval_threshold_utility_np(w, a, config, epsilon=1e-6):
-    """Evaluate threshold utility with numpy."""
-    threshold = config.get('threshold', 50.0)
-    sharpness = config.get('sharpness', 1.0)
-    base_config = config.get('base_utility', {'type': 'LINEAR'})
-    
-    base_util = eval_utility_np(w, a, base_config)
-    total = np.sum(a)
-    sigmoid_val = sigmoid(sharpness * (total - threshold))
-    
-    return sigmoid_val * base_util
-
-
-def eval_satiation_utility_np(w, a, config, epsilon=1e-6):
-    """Evaluate satiation utility with numpy."""
-    max_utility = config.get('max_utility', 100.0)
-    saturation_param = config.get('saturation_param', 10.0)
-    hyperbolic = config.get('hyperbolic', False)
-    base_config = config.get('base_utility', {'type': 'LINEAR'})
-    
-    base_util = eval_utility_np(w, a, base_config)
-    
-    if hyperbolic:
-        return max_utility * base_util / (saturation_param + base_util + epsilon)
-    else:
-        return max_utility * (1 - np.exp(-base_util / saturation_param))
-
-
-def eval_nested_ces_utility_np(w, a, config, resource_names, epsilon=1e-6):
-    """Evaluate nested CES utility with numpy."""
-    nests = config.get('nests', [])
-    nest_rhos = config.get('nest_rhos', [])
-    nest_weights = config.get('nest_weights', [])
-    outer_rho = config.get('outer_rho', 0.5)
-    
-    if not nests:
-        return eval_linear_utility_np(w, a)
-    
-    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
-    
-    nest_values = []
-    for nest_idx, nest in enumerate(nests):
-        rho = nest_rhos[nest_idx] if nest_idx < len(nest_rhos) else 0.5
+@lazy_njit(cache=True, fastmath=True)
+def _eval_nested_ces_kernel(a, nest_starts, res_idx, weights, rhos, alphas, outer_rho, epsilon):
+    """
+    Nested CES on flat arrays. Nest k covers res_idx/weights entries
+    nest_starts[k]:nest_starts[k+1] and has exponent rhos[k] and outer
+    weight alphas[k].
+    """
+    n_nests = rhos.shape[0]
+    outer_sum = 0.0
+    for k in range(n_nests):
+        rho = rhos[k]
+        inner_sum = 0.0
+        for t in range(nest_starts[k], nest_starts[k + 1]):
+            a_j = max(a[res_idx[t]], epsilon)
+            if abs(rho) < 0.01:
+                inner_sum += weights[t] * np.log(a_j)
+            else:
+                inner_sum += weights[t] * a_j ** rho
         
         if abs(rho) < 0.01:
-            # Cobb-Douglas
-            log_sum = 0
-            for res_name, weight in nest.items():
-                if res_name in res_to_idx:
-                    j = res_to_idx[res_name]
-                    log_sum += weight * np.log(max(a[j], epsilon))
-            nest_values.append(np.exp(log_sum))
+            # Cobb-Douglas nest
+            nest_value = np.exp(inner_sum)
+        else:
+            # CES nest
+            nest_value = max(inner_sum, epsilon) ** (1.0 / rho)
+        
+        if abs(outer_rho) < 0.01:
+            outer_sum += alphas[k] * np.log(max(nest_value, epsilon))
         else:
-            # CES
-            power_sum = 0
-            for res_name, weight in nest.items():
-                if res_name in res_to_idx:
-                    j = res_to_idx[res_name]
-                    power_sum += weight * (max(a[j], epsilon) ** rho)
-            nest_values.append(max(power_sum, epsilon) ** (1.0 / rho))
+            outer_sum += alphas[k] * max(nest_value, epsilon) ** outer_rho
     
     # Combine with outer CES
     if abs(outer_rho) < 0.01:
-        log_sum = 0
-        for i, nv in enumerate(nest_values):
-            alpha = nest_weights[i] if i < len(nest_weights) else 1.0 / len(nest_values)
-            log_sum += alpha * np.log(max(nv, epsilon))
-        return np.exp(log_sum)
-    else:
-        power_sum = 0
-        for i, nv in enumerate(nest_values):
-            alpha = nest_weights[i] if i < len(nest_weights) else 1.0 / len(nest_values)
-            power_sum += alpha * (max(nv, epsilon) ** outer_rho)
-        return max(power_sum, epsilon) ** (1.0 / outer_rho)
+        return np.exp(outer_sum)
+    return max(outer_sum, epsilon) ** (1.0 / outer_rho)
 
 
-def eval_softplus_loss_aversion_np(w, a, config, resource_names, epsilon=1e-6):
-    """Evaluate softplus loss aversion utility with numpy."""
-    reference_points = config.get('reference_points', {})
-    lambda_param = config.get('lambda', 2.0)
-    tau = config.get('tau', 1.0)
-    weights = config.get('weights', {})
-    
-    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
-    
-    utility = 0
-    for res_name, weight in weights.items():
-        if res_name not in res_to_idx:
-            continue
-        j = res_to_idx[res_name]
-        ref = reference_points.get(res_name, 0.0)
-        x = a[j] - ref
-        
-        # g(x) = x - (λ - 1) · τ · ln(1 + exp(-x / τ))
-        if x / tau > 20:
-            g_x = x
-        elif x / tau < -20:
-            g_x = lambda_param * x
-        else:
-            g_x = x - (lambda_param - 1) * tau * np.log(1 + np.exp(-x / tau))
-        
-        utility += weight * g_x
+def flatten_nests(config, res_to_idx):
+    """
+    Flatten a nested CES config into CSR-style arrays for the kernel:
+    (nest_starts, res_idx, weights, rhos, alphas).
+    """
+    nests = config.get('nests', [])
+    nest_rhos = config.get('nest_rhos', [])
+    nest_weights = config.get('nest_weights', [])
     
-    return utility
+    resolved = [resolve_indices(nest, res_to_idx) for nest in nests]
+    nest_starts = np.zeros(len(nests) + 1, dtype=np.int64)
+    nest_starts[1:] = np.cumsum([len(idx) for idx, _, _ in resolved])
+    res_idx = np.concatenate([idx for idx, _, _ in resolved]).astype(np.int64)
+    weights = np.concatenate([w for _, w, _ in resolved]).astype(np.float64)
+    rhos = np.array([nest_rhos[k] if k < len(nest_rhos) else 0.5
+                     for k in range(len(nests))], dtype=np.float64)
+    alphas = np.array([nest_weights[k] if k < len(nest_weights) else 1.0 / len(nests)
+                       for k in range(len(nests))], dtype=np.float64)
+    return nest_starts, res_idx, weights, rhos, alphas
 
 
-def eval_asymmetric_log_loss_aversion_np(w, a, config, resource_names, epsilon=1e-6):
-    """Evaluate asymmetric log loss aversion utility with numpy."""
-    reference_points = config.get('reference_points', {})
-    lambda_param = max(1.0, config.get('lambda', 2.0))
-    kappa = max(epsilon, config.get('kappa', 10.0))
-    weights = config.get('weights', {})
-    
-    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
-    
-    utility = 0
-    for res_name, weight in weights.items():
-        if res_name not in res_to_idx:
-            continue
-        j = res_to_idx[res_name]
-        ref = reference_points.get(res_name, 0.0)
-        x = a[j] - ref
+def eval_flat_nested_ces_np(a, flat_nests, outer_rho, epsilon=1e-6):
+    """Evaluate nested CES from the arrays of flatten_nests()."""
+    return _eval_nested_ces_kernel(np.asarray(a, dtype=np.float64), *flat_nests,
+                                   float(outer_rho), epsilon)
+
+
+def softplus_loss_aversion_terms(x, lambda_param, tau):
+    """g(x) = x - (λ - 1)·τ·ln(1 + e^(-x/τ)), with a stable softplus."""
+    return x - (lambda_param - 1) * tau * np.logaddexp(0, -x / tau)
+
+
+def asymmetric_log_loss_aversion_terms(x, lambda_param, kappa):
+    """h(x) = log(1 + x/κ) for gains, -λ·log(1 + |x|/κ) for losses."""
+    return np.where(x >= 0, 1.0, -lambda_param) * np.log1p(np.abs(x) / kappa)
+
+
+def loss_aversion_params(config, util_type, epsilon=1e-6):
+    """(λ, τ) for softplus loss aversion, (λ, κ) for asymmetric log loss aversion."""
+    if util_type == 'SOFTPLUS_LOSS_AVERSION':
+        return float(config.get('lambda', 2.0)), float(config.get('tau', 1.0))
+    return (float(max(1.0, config.get('lambda', 2.0))),
+            float(max(epsilon, config.get('kappa', 10.0))))
+
+
+def eval_utilities_np(W, A, agents):
+    """
+    Evaluate every agent's utility with numpy.
+    
+    `agents` is the struct of arrays from parse_agent_configs. Agents are
+    grouped by utility type and every type except NESTED_CES is evaluated
+    in one vectorized call over its block of rows; THRESHOLD and SATIATION
+    evaluate their base utilities through a recursive call on the parsed
+    base configs. NESTED_CES runs its compiled kernel per agent. Returns a
+    length-n array.
+    """
+    values = np.empty(W.shape[0])
+    for util_type, rows in agents['groups'].items():
+        idx = rows.tolist()
+        if len(agents['groups']) == 1:
+            # Homogeneous agents (the usual all-LINEAR request): one reduction
+            # over the whole matrices, without gathering a copy of each
+            rows = slice(None)
+        W_g, A_g = W[rows, :], A[rows, :]
         
-        if x >= 0:
-            g_x = np.log(1 + x / kappa)
+        if util_type == 'SQRT':
+            values[rows] = eval_sqrt_utility_np(W_g, A_g)
+        elif util_type == 'LOG':
+            values[rows] = eval_log_utility_np(W_g, A_g)
+        elif util_type == 'COBB_DOUGLAS':
+            values[rows] = eval_cobb_douglas_utility_np(W_g, A_g)
+        elif util_type == 'CES':
+            values[rows] = eval_ces_utility_np(W_g, A_g, agents['rho'][rows])
+        elif util_type == 'LEONTIEF':
+            values[rows] = eval_leontief_utility_np(W_g, A_g)
+        elif util_type == 'SOFTPLUS_LOSS_AVERSION':
+            g = softplus_loss_aversion_terms(
+                A_g - agents['refs'][rows], agents['lambda'][rows, None], agents['tau'][rows, None])
+            values[rows] = weighted_row_sum_np(agents['ref_weights'][rows], g)
+        elif util_type == 'ASYMMETRIC_LOG_LOSS_AVERSION':
+            g = asymmetric_log_loss_aversion_terms(
+                A_g - agents['refs'][rows], agents['lambda'][rows, None], agents['kappa'][rows, None])
+            values[rows] = weighted_row_sum_np(agents['ref_weights'][rows], g)
+        elif util_type == 'NESTED_CES':
+            for i in idx:
+                if agents['nests'][i] is None:
+                    values[i] = eval_linear_utility_np(W[i, :], A[i, :])
+                else:
+                    values[i] = eval_flat_nested_ces_np(A[i, :], agents['nests'][i],
+                                                        agents['outer_rho'][i])
+        elif util_type == 'THRESHOLD':
+            base = eval_utilities_np(W_g, A_g, agents['base']['THRESHOLD'])
+            totals = np.sum(A_g, axis=-1)
+            values[rows] = sigmoid(agents['sharpness'][rows] * (totals - agents['threshold'][rows])) * base
+        elif util_type == 'SATIATION':
+            base = eval_utilities_np(W_g, A_g, agents['base']['SATIATION'])
+            max_utility = agents['max_utility'][rows]
+            saturation_param = agents['saturation_param'][rows]
+            values[rows] = np.where(
+                agents['hyperbolic'][rows],
+                max_utility * base / (saturation_param + base + 1e-6),
+                max_utility * (1 - np.exp(-base / saturation_param)))
         else:
-            g_x = -lambda_param * np.log(1 + abs(x) / kappa)
-        
-        utility += weight * g_x
+            values[rows] = eval_linear_utility_np(W_g, A_g)
     
-    return utility
+    return values
 
 
-def eval_utility_np(w, a, util_config, resource_names=None):
-    """Evaluate utility with numpy based on config."""
-    if util_config is None:
-        return eval_linear_utility_np(w, a)
-    
-    util_type = util_config.get('type', 'LINEAR')
+# ============================================================================
+# Agent Config Parsing
+# ============================================================================
+
+def parse_agent_configs(utility_configs, res_to_idx, m, epsilon=1e-6):
+    """
+    Parse the per-agent utility configs once into a struct of arrays.
+    
+    Returns a dict with:
+        types:               (n,) utility type names
+        groups:              {type: row indices} for each type present
+        rho:                 (n,) CES exponents, NaN for other agents
+        lambda, tau, kappa:  (n,) loss-aversion parameters, NaN where unused
+        ref_weights, refs:   (n, m) resource weights and reference points of
+                             loss-aversion agents, 0 for unnamed resources
+        nests, outer_rho:    per-agent flatten_nests() arrays and outer
+                             exponent for NESTED_CES agents (None / NaN
+                             elsewhere)
+        threshold, sharpness: (n,) THRESHOLD parameters, NaN where unused
+        max_utility, saturation_param, hyperbolic:
+                             (n,) SATIATION parameters, NaN / False where
+                             unused
+        base:                {'THRESHOLD' / 'SATIATION': the same struct
+                             parsed from the base_utility configs of that
+                             group's rows, in group order}
+    
+    Resource names are resolved to column indices here, once per request,
+    so evaluation never touches them.
+    """
+    n = len(utility_configs)
+    types = np.array([(cfg.get('type', 'LINEAR') if cfg else 'LINEAR')
+                      for cfg in utility_configs])
+    rho = np.full(n, np.nan)
+    lambdas = np.full(n, np.nan)
+    taus = np.full(n, np.nan)
+    kappas = np.full(n, np.nan)
+    ref_weights = np.zeros((n, m))
+    refs = np.zeros((n, m))
+    nests = [None] * n
+    outer_rho = np.full(n, np.nan)
+    thresholds = np.full(n, np.nan)
+    sharpness = np.full(n, np.nan)
+    max_utility = np.full(n, np.nan)
+    saturation_param = np.full(n, np.nan)
+    hyperbolic = np.zeros(n, dtype=bool)
+    
+    for i, (util_type, cfg) in enumerate(zip(types, utility_configs)):
+        if util_type == 'THRESHOLD':
+            thresholds[i] = cfg.get('threshold', 50.0)
+            sharpness[i] = cfg.get('sharpness', 1.0)
+        elif util_type == 'SATIATION':
+            max_utility[i] = cfg.get('max_utility', 100.0)
+            saturation_param[i] = cfg.get('saturation_param', 10.0)
+            hyperbolic[i] = cfg.get('hyperbolic', False)
+        elif util_type == 'CES':
+            rho[i] = cfg.get('rho', 0.5)
+        elif util_type == 'NESTED_CES' and cfg.get('nests', []):
+            nests[i] = flatten_nests(cfg, res_to_idx)
+            outer_rho[i] = cfg.get('outer_rho', 0.5)
+        elif util_type in ['SOFTPLUS_LOSS_AVERSION', 'ASYMMETRIC_LOG_LOSS_AVERSION']:
+            lambdas[i], shape = loss_aversion_params(cfg, util_type, epsilon)
+            if util_type == 'SOFTPLUS_LOSS_AVERSION':
+                taus[i] = shape
+            else:
+                kappas[i] = shape
+            idx, weights, ref_arr = resolve_indices(
+                cfg.get('weights', {}), res_to_idx, cfg.get('reference_points', {}))
+            ref_weights[i, idx] = weights
+            refs[i, idx] = ref_arr
+    
+    # Sorted by type, so that iteration (and hence evaluation) order is
+    # deterministic
+    groups = {util_type: np.flatnonzero(types == util_type)
+              for util_type in np.unique(types)}
+    
+    # Base utilities of the wrapper types are evaluated without resource
+    # names, so name-based bases count as linear
+    base = {}
+    for util_type in ['THRESHOLD', 'SATIATION']:
+        if util_type in groups:
+            base_configs = [utility_configs[i].get('base_utility', {'type': 'LINEAR'})
+                            for i in groups[util_type]]
+            base_configs = [None if cfg and cfg.get('type') in [
+                                'NESTED_CES', 'SOFTPLUS_LOSS_AVERSION',
+                                'ASYMMETRIC_LOG_LOSS_AVERSION'] else cfg
+                            for cfg in base_configs]
+            base[util_type] = parse_agent_configs(base_configs, res_to_idx, m, epsilon)
     
-    if util_type == 'LINEAR':
-        return eval_linear_utility_np(w, a)
-    elif util_type == 'SQRT':
-        return eval_sqrt_utility_np(w, a)
-    elif util_type == 'LOG':
-        return eval_log_utility_np(w, a)
-    elif util_type == 'COBB_DOUGLAS':
-        return eval_cobb_douglas_utility_np(w, a)
-    elif util_type == 'CES':
-        rho = util_config.get('rho', 0.5)
-        return eval_ces_utility_np(w, a, rho)
-    elif util_type == 'LEONTIEF':
-        mask = w > 1e-8
-        if not np.any(mask):
-            return 0.0
-        return np.min(a[mask] / w[mask])
-    elif util_type == 'THRESHOLD':
-        return eval_threshold_utility_np(w, a, util_config)
-    elif util_type == 'SATIATION':
-        return eval_satiation_utility_np(w, a, util_config)
-    elif util_type == 'NESTED_CES':
-        if resource_names is None:
-            return eval_linear_utility_np(w, a)
-        return eval_nested_ces_utility_np(w, a, util_config, resource_names)
-    elif util_type == 'SOFTPLUS_LOSS_AVERSION':
-        if resource_names is None:
-            return eval_linear_utility_np(w, a)
-        return eval_softplus_loss_aversion_np(w, a, util_config, resource_names)
-    elif util_type == 'ASYMMETRIC_LOG_LOSS_AVERSION':
-        if resource_names is None:
-            return eval_linear_utility_np(w, a)
-        return eval_asymmetric_log_loss_aversion_np(w, a, util_config, resource_names)
-    else:
-        return eval_linear_utility_np(w, a)
+    return {
+        "types": types,
+        "groups": groups,
+        "rho": rho,
+        "lambda": lambdas,
+        "tau": taus,
+        "kappa": kappas,
+        "ref_weights": ref_weights,
+        "refs": refs,
+        "nests": nests,
+        "outer_rho": outer_rho,
+        "threshold": thresholds,
+        "sharpness": sharpness,
+        "max_utility": max_utility,
+        "saturation_param": saturation_param,
+        "hyperbolic": hyperbolic,
+        "base": base,
+    }
 
 
 # ============================================================================
-# Main Solver
+# Problem Cache
 # ============================================================================
 
-def solve_joint_allocation(data):
+# Compiled problems keyed by structure (see _problem_key). Numeric data enters
+# through cp.Parameter objects, so a cache hit skips canonicalization. Kept in
+# least-recently-used order; the size is overridable for long-running callers
+# that alternate between many structures.
+_PROBLEM_CACHE = {}
+_PROBLEM_CACHE_SIZE = int(os.environ.get('CARMA_PROBLEM_CACHE_SIZE') or 32)
+
+
+def _problem_key(n, m, utility_configs, res_to_idx):
     """
-    Solve the joint multi-resource allocation problem with nonlinear utilities.
+    Structural key for a problem: its shape plus everything baked into the
+    expression tree (utility configs and resource names). Numeric data
+    (W, c, Q, minimums, ideals) is deliberately excluded.
     """
-    n = data['n_agents']
-    m = data['n_resources']
+    return (n, m, json.dumps(utility_configs, sort_keys=True), tuple(res_to_idx))
+
+
+def group_agents(utility_configs):
+    """
+    Group agents that can share one vectorized log(Φ) expression.
     
-    # Extract matrices
-    W = np.array(data['preferences'])           # n x m preference weights
-    c = np.array(data['priority_weights'])      # n priority weights
-    Q = np.array(data['capacities'])            # m capacities
-    mins = np.array(data['minimums'])           # n x m minimums
-    ideals = np.array(data['ideals'])           # n x m ideals
+    Returns {key: row indices} where key is (type,) for the basic families,
+    ('CES', ρ) for CES, (SOFTPLUS_LOSS_AVERSION,) for the agents sharing
+    one gathered block and (type, i) for the other composite types, whose
+    expression depends on the agent's own config and is built one agent
+    at a time.
+    """
+    groups = {}
+    for i, cfg in enumerate(utility_configs):
+        util_type = cfg.get('type', 'LINEAR') if cfg else 'LINEAR'
+        
+        if util_type in ['SQRT', 'LOG', 'COBB_DOUGLAS', 'SOFTPLUS_LOSS_AVERSION']:
+            key = (util_type,)
+        elif util_type == 'CES':
+            rho = cfg.get('rho', 0.5)
+            # Outside (0, 1) fall back to linear approximation
+            key = ('CES', rho) if 0 < rho < 1 else ('LINEAR',)
+        elif util_type in ['THRESHOLD', 'SATIATION', 'NESTED_CES',
+                           'ASYMMETRIC_LOG_LOSS_AVERSION']:
+            key = (util_type, i)
+        else:
+            # Default to linear
+            key = ('LINEAR',)
+        groups.setdefault(key, []).append(i)
+    return {key: np.array(rows) for key, rows in groups.items()}
+
+
+def build_block(key, W, A, A_safe, rows, utility_configs, res_to_idx, epsilon=1e-6):
+    """
+    log(Φ) for the agents in one group as a single vector expression.
+    """
+    util_type = key[0]
     
-    # Get resource names for advanced utility types
-    resource_names = data.get('resource_names', [f'R{j}' for j in range(m)])
+    if util_type in ['LINEAR', 'SQRT', 'LOG', 'COBB_DOUGLAS', 'CES']:
+        rho = key[1] if util_type == 'CES' else None
+        return compute_log_phi(util_type, W[rows, :], A[rows, :], A_safe[rows, :], rho)
     
-    # Get utility configurations (one per agent, or None for all linear)
-    utility_configs = data.get('utility_configs', None)
-    if utility_configs is None:
-        utility_configs = [None] * n
-    elif isinstance(utility_configs, dict):
-        # Single config for all agents
-        utility_configs = [utility_configs] * n
-    
-    # Validate inputs
-    assert W.shape == (n, m), f"Preferences shape mismatch: {W.shape} vs ({n}, {m})"
-    assert c.shape == (n,), f"Priority weights shape mismatch"
-    assert Q.shape == (m,), f"Capacities shape mismatch"
-    assert mins.shape == (n, m), f"Minimums shape mismatch"
-    assert ideals.shape == (n, m), f"Ideals shape mismatch"
+    if util_type == 'SOFTPLUS_LOSS_AVERSION':
+        return cp.log(compute_softplus_loss_aversion_block(A, rows, utility_configs, res_to_idx))
     
-    # Check feasibility
-    min_totals = np.sum(mins, axis=0)
-    for j in range(m):
-        if min_totals[j] > Q[j]:
-            return {
-                "status": "infeasible",
-                "error": f"Resource {j}: sum of minimums ({min_totals[j]}) exceeds capacity ({Q[j]})",
-                "allocations": mins.tolist(),
-                "objective": float('-inf'),
-                "solver": "none"
-            }
+    # For complex types, use the full utility expression
+    # This may not be DCP-compliant for all cases
+    i = int(rows[0])
+    try:
+        if util_type == 'THRESHOLD':
+            return compute_log_threshold_utility(W, A, i, utility_configs[i], epsilon)
+        return cp.log(get_utility_for_agent(W, A, i, utility_configs[i], epsilon, res_to_idx))
+    except Exception:
+        # Fall back to linear
+        return compute_log_phi('LINEAR', W[i, :], A[i, :], A_safe[i, :])
+
+
+def build_problem(n, m, utility_configs, res_to_idx, epsilon=1e-6):
+    """
+    Build the DPP-parametrized allocation problem for a given structure.
     
-    # Ensure bounds are consistent
-    mins = np.minimum(mins, ideals)
+    Parameters only appear in affine positions (weights multiplying
+    expressions of A, constraint right-hand sides), so CVXPY caches the
+    canonicalization and later solves only refresh parameter values.
+    """
+    W = cp.Parameter((n, m), nonneg=True, name='W')
+    c = cp.Parameter(n, nonneg=True, name='c')
+    Q = cp.Parameter(m, name='Q')
+    mins = cp.Parameter((n, m), name='mins')
+    ideals = cp.Parameter((n, m), name='ideals')
     
     # Decision variables
     A = cp.Variable((n, m), nonneg=True)
     
-    # Small epsilon for numerical stability
-    epsilon = 1e-6
-    
-    # Build utility variables for each agent
-    utilities = []
-    for i in range(n):
-        u_i = get_utility_for_agent(W, A, i, utility_configs[i], epsilon, resource_names)
-        utilities.append(u_i)
-    
-    # Compute minimum achievable utility for each agent
-    min_utilities = []
-    for i in range(n):
-        min_u = eval_utility_np(W[i, :], mins[i, :], utility_configs[i], resource_names)
-        min_utilities.append(max(epsilon, min_u))
-    min_utilities = np.array(min_utilities)
-    
-    # Objective: maximize Σᵢ cᵢ · log(Φᵢ)
-    # For DCP compliance, we use auxiliary variables
-    u = cp.Variable(n, nonneg=True)
-    
-    objective = cp.Maximize(c @ cp.log(u))
+    # Shifted allocations for the families that need strictly positive
+    # arguments, formed once and sliced per group
+    A_safe = A + epsilon
+    
+    # Objective: maximize Σᵢ cᵢ · log(Φᵢ) through the epigraph tᵢ ≤ log(Φᵢ).
+    # log(Φ) already contains the parameter W, and c @ log(Φ) would be a
+    # product of parameter-dependent terms, which is not DPP
+    t = cp.Variable(n)
+    objective = cp.Maximize(c @ t)
+    
+    # Epigraph constraints, one vectorized block per group of agents
+    epigraph = []
+    for key, rows in group_agents(utility_configs).items():
+        if key == ('LINEAR',):
+            # tᵢ ≤ log(wᵢ·aᵢ) is exactly the cone (tᵢ, 1, wᵢ·aᵢ) ∈ K_exp.
+            # Written as t <= cp.log(...), CVXPY would add a second variable
+            # and row per agent for the log's own epigraph
+            epigraph.append(cp.constraints.ExpCone(
+                t[rows], np.ones(len(rows)), compute_linear_utility(W[rows, :], A[rows, :])))
+        else:
+            epigraph.append(
+                t[rows] <= build_block(key, W, A, A_safe, rows, utility_configs, res_to_idx, epsilon))
     
     # Constraints
     constraints = [
@@ -696,121 +1041,375 @@ def solve_joint_allocation(data):
         A >= mins,
         # Maximum requests
         A <= ideals,
-        # Minimum utility
-        u >= min_utilities,
-    ]
-    
-    # Link u to actual utility - depends on utility type
-    # Check if all utilities are linear
-    all_linear = all(
-        (cfg is None or cfg.get('type', 'LINEAR') == 'LINEAR')
-        for cfg in utility_configs
-    )
-    
-    if all_linear:
-        # Simple linear case - direct constraint
-        constraints.append(u == cp.sum(cp.multiply(W, A), axis=1))
-    else:
-        # For nonlinear utilities, we need individual constraints
-        for i in range(n):
-            cfg = utility_configs[i]
-            util_type = cfg.get('type', 'LINEAR') if cfg else 'LINEAR'
-            
-            if util_type == 'LINEAR':
-                constraints.append(u[i] == cp.sum(cp.multiply(W[i, :], A[i, :])))
-            elif util_type == 'SQRT':
-                sqrt_sum = cp.sum(cp.multiply(W[i, :], cp.sqrt(A[i, :] + epsilon)))
-                constraints.append(u[i] <= cp.square(sqrt_sum))
-            elif util_type == 'LOG':
-                log_sum = cp.sum(cp.multiply(W[i, :], cp.log(1 + A[i, :] + epsilon)))
-                constraints.append(u[i] <= log_sum)
-            elif util_type == 'COBB_DOUGLAS':
-                log_prod = cp.sum(cp.multiply(W[i, :], cp.log(A[i, :] + epsilon)))
-                constraints.append(u[i] <= cp.exp(log_prod))
-            elif util_type == 'CES':
-                rho = cfg.get('rho', 0.5)
-                if rho > 0 and rho < 1:
-                    power_sum = cp.sum(cp.multiply(W[i, :], cp.power(A[i, :] + epsilon, rho)))
-                    constraints.append(u[i] <= cp.power(power_sum, 1.0 / rho))
-                else:
-                    # Fall back to linear approximation
-                    constraints.append(u[i] == cp.sum(cp.multiply(W[i, :], A[i, :])))
-            elif util_type in ['THRESHOLD', 'SATIATION', 'NESTED_CES', 
-                              'SOFTPLUS_LOSS_AVERSION', 'ASYMMETRIC_LOG_LOSS_AVERSION']:
-                # For complex types, use the full utility expression
-                # This may not be DCP-compliant for all cases
-                try:
-                    util_expr = get_utility_for_agent(W, A, i, cfg, epsilon, resource_names)
-                    constraints.append(u[i] <= util_expr)
-                except Exception:
-                    # Fall back to linear
-                    constraints.append(u[i] == cp.sum(cp.multiply(W[i, :], A[i, :])))
-            else:
-                # Default to linear
-                constraints.append(u[i] == cp.sum(cp.multiply(W[i, :], A[i, :])))
+        # No minimum-utility row: with W ≥ 0 every utility is nondecreasing
+        # in A, so A ≥ mins already guarantees it, and a log-space bound
+        # stalls the interior point when it is nearly active at large scale
+    ] + epigraph
     
-    # Solve
     problem = cp.Problem(objective, constraints)
     
-    solvers_to_try = ['CLARABEL', 'ECOS', 'SCS']
+    return {
+        "problem": problem,
+        # Checked once per structure: a non-DCP problem fails identically on
+        # every solve, and a DCP but non-DPP one cannot reuse its
+        # canonicalization (ignore_dpp then skips the parametrized path)
+        "dcp": problem.is_dcp(),
+        "dpp": problem.is_dcp(dpp=True),
+        # Per-solver Problem objects, filled by solver_problem
+        "solver_problems": {},
+        "A": A,
+        "W": W,
+        "c": c,
+        "Q": Q,
+        "mins": mins,
+        "ideals": ideals,
+    }
+
+
+def get_problem(n, m, utility_configs, res_to_idx, epsilon=1e-6):
+    """Fetch the cached problem for this structure, building it on a miss."""
+    key = _problem_key(n, m, utility_configs, res_to_idx)
+    entry = _PROBLEM_CACHE.pop(key, None)
+    if entry is None:
+        if len(_PROBLEM_CACHE) >= _PROBLEM_CACHE_SIZE:
+            # Evict the least recently used entry (dicts preserve insertion
+            # order and hits are re-inserted at the end)
+            del _PROBLEM_CACHE[next(iter(_PROBLEM_CACHE))]
+        load_cvxpy()
+        entry = build_problem(n, m, utility_configs, res_to_idx, epsilon)
+    _PROBLEM_CACHE[key] = entry
+    return entry
+
+
+# ============================================================================
+# Solve Routes
+# ============================================================================
+
+def solver_problem(entry, solver_name):
+    """
+    The cached Problem to hand to solver_name.
+    
+    CVXPY keys a Problem's canonicalization cache on the solver, so failing
+    over to ECOS on the shared Problem would discard Clarabel's compiled
+    parametrized program, and the next request would rebuild it. Each
+    solver instead gets its own Problem over the same objective and
+    constraints, hence the same Parameters and Variables: values set once
+    reach every solver, and each canonicalization survives the others.
+    """
+    problems = entry["solver_problems"]
+    if solver_name not in problems:
+        problem = entry["problem"]
+        problems[solver_name] = (problem if not problems
+                                 else cp.Problem(problem.objective, problem.constraints))
+    return problems[solver_name]
+
+
+def solve_with_cvxpy(n, m, utility_configs, res_to_idx, W, c, Q, mins, ideals,
+                     epsilon=1e-6):
+    """
+    Solve through the cached CVXPY problem, trying each solver in turn.
+    
+    Returns a dict with status ('optimal' or 'infeasible'), allocations,
+    objective, solver and error.
+    """
+    # Fetch (or build) the parametrized problem and load this instance's data
+    entry = get_problem(n, m, utility_configs, res_to_idx, epsilon)
+    entry["W"].value = W
+    entry["c"].value = c
+    entry["Q"].value = Q
+    entry["mins"].value = mins
+    entry["ideals"].value = ideals
+    
+    if not entry["dcp"]:
+        return {
+            "status": "infeasible",
+            "error": "Problem does not follow DCP rules",
+            "solver": "none",
+        }
+    
+    # Solve
     used_solver = None
     solve_error = None
     
-    for solver_name in solvers_to_try:
+    for solver_name in INSTALLED_SOLVERS:
         try:
-            solver = getattr(cp, solver_name, None)
-            if solver is None:
-                continue
-            problem.solve(solver=solver, verbose=False)
-            if problem.status in [cp.OPTIMAL, cp.OPTIMAL_INACCURATE]:
+            problem = solver_problem(entry, solver_name)
+            problem.solve(ignore_dpp=not entry["dpp"], **SOLVE_KWARGS[solver_name])
+            if problem.status in SOLVED_STATUSES:
                 used_solver = solver_name
                 break
-            else:
-                solve_error = f"{solver_name}: status={problem.status}"
-        except cp.error.SolverError as e:
-            solve_error = f"{solver_name}: {str(e)}"
-            continue
+            solve_error = f"{solver_name}: status={problem.status}"
+            if problem.status in CERTIFIED_STATUSES:
+                # A certificate, not a solver failure
+                break
         except Exception as e:
             solve_error = f"{solver_name}: {str(e)}"
             continue
     
-    if problem.status not in [cp.OPTIMAL, cp.OPTIMAL_INACCURATE]:
+    # Checked through used_solver: after a failed attempt problem.status can
+    # still hold the previous call's result
+    if used_solver is None:
+        return {
+            "status": "infeasible",
+            "error": solve_error or "No installed solver",
+            "solver": "none",
+        }
+    
+    return {
+        "status": "optimal",
+        "allocations": entry["A"].value,
+        "objective": float(problem.value),
+        "solver": used_solver,
+    }
+
+
+# Native Clarabel solvers for the all-LINEAR path, keyed by shape. Every
+# instance of a shape has the same sparsity pattern, so later solves update
+# the data in place instead of re-allocating the solver.
+_LINEAR_SOLVER_CACHE = {}
+
+
+def solve_linear_fast(W, c, Q, mins, ideals, epsilon=1e-6):
+    """
+    Solve the all-LINEAR problem with Clarabel's native API, skipping CVXPY.
+    
+    Variables x = [vec(A), t] with tᵢ ≤ log(wᵢ·aᵢ) expressed as the
+    exponential cone (tᵢ, 1, wᵢ·aᵢ) ∈ K_exp, so the problem is
+        minimize    -c·t
+        subject to  Σᵢ aᵢⱼ ≤ Qⱼ,  max(minᵢⱼ, 0) ≤ aᵢⱼ ≤ idealᵢⱼ,
+                    (tᵢ, 1, wᵢ·aᵢ) ∈ K_exp
+    The minimum-utility bound is implied by the lower bounds (W ≥ 0), as in
+    build_problem.
+    
+    Returns the same dict as solve_with_cvxpy, or None if Clarabel does not
+    reach a solution so the caller can retry through CVXPY.
+    """
+    n, m = W.shape
+    N = n * m
+    agent = np.repeat(np.arange(n), m)
+    cells = np.arange(N)
+    
+    # Nonnegative cone rows (b - A·x ≥ 0): capacity, lower bounds, upper
+    # bounds
+    rows = [np.tile(np.arange(m), n), m + cells, m + N + cells]
+    cols = [cells, cells, cells]
+    vals = [np.ones(N), -np.ones(N), np.ones(N)]
+    b = [Q, -np.maximum(mins, 0).ravel(), ideals.ravel()]
+    
+    # Exponential cone rows per agent: (tᵢ, 1, wᵢ·aᵢ)
+    exp_base = m + 2 * N + 3 * np.arange(n)
+    rows += [exp_base, exp_base[agent] + 2]
+    cols += [N + np.arange(n), cells]
+    vals += [-np.ones(n), -W.ravel()]
+    b_exp = np.zeros((n, 3))
+    b_exp[:, 1] = 1.0
+    b.append(b_exp.ravel())
+    
+    n_rows = m + 2 * N + 3 * n
+    A_con = sp.csc_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                          shape=(n_rows, N + n))
+    P = sp.csc_matrix((N + n, N + n))
+    q = np.concatenate([np.zeros(N), -c])
+    cones = [clarabel.NonnegativeConeT(m + 2 * N)] + [clarabel.ExponentialConeT()] * n
+    
+    b = np.concatenate(b)
+    
+    # Popped and re-inserted below, so the dict stays in least recently used
+    # order as in _PROBLEM_CACHE
+    solver = _LINEAR_SOLVER_CACHE.pop((n, m), None)
+    if not WARM_START:
+        solver = None
+    if solver is not None and solver.is_data_update_allowed():
+        try:
+            solver.update(q=q, A=A_con, b=b)
+        except Exception:
+            # Sparsity pattern changed (e.g. explicit zeros in W)
+            solver = None
+    else:
+        solver = None
+    
+    if solver is None:
+        settings = clarabel.DefaultSettings()
+        settings.verbose = False
+        for name, value in CLARABEL_SETTINGS.items():
+            setattr(settings, name, value)
+        solver = clarabel.DefaultSolver(P, q, A_con, b, cones, settings)
+        if len(_LINEAR_SOLVER_CACHE) >= _PROBLEM_CACHE_SIZE:
+            # Evict the least recently used solver
+            del _LINEAR_SOLVER_CACHE[next(iter(_LINEAR_SOLVER_CACHE))]
+    _LINEAR_SOLVER_CACHE[(n, m)] = solver
+    
+    solution = solver.solve()
+    
+    if solution.status not in [clarabel.SolverStatus.Solved, clarabel.SolverStatus.AlmostSolved]:
+        return None
+    
+    # The objective is recomputed from the allocations rather than read off
+    # c·t, which only matches Σᵢ cᵢ·log(wᵢ·aᵢ) to the solver's tolerance
+    allocations = np.array(solution.x[:N]).reshape(n, m)
+    return {
+        "status": "optimal",
+        "allocations": allocations,
+        "objective": log_welfare(c, eval_linear_utility_np(W, allocations), epsilon),
+        "solver": "CLARABEL",
+    }
+
+
+# ============================================================================
+# Main Solver
+# ============================================================================
+
+def as_float64(x, shape=None):
+    """
+    JSON list (or array) → C-contiguous float64 array in one conversion.
+    
+    Mixed int/float lists never produce integer or object arrays, and every
+    downstream reduction sees the same dtype and layout. With shape given,
+    a flattened (row-major) matrix of that size is accepted as well as a
+    nested one; anything else is left for validate_inputs to report.
+    """
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    if shape is not None and x.ndim == 1 and x.size == np.prod(shape):
+        x = x.reshape(shape)
+    return x
+
+
+def read_utility_configs(data, n):
+    """
+    The request's utility configs as one entry per agent: absent means all
+    linear, and a single dict applies to every agent.
+    """
+    utility_configs = data.get('utility_configs', None)
+    if utility_configs is None:
+        return [None] * n
+    if isinstance(utility_configs, dict):
+        return [utility_configs] * n
+    return utility_configs
+
+
+def validate_inputs(n, m, W, c, Q, mins, ideals, utility_configs):
+    """
+    Check every input's shape against (n, m), that there is one utility
+    config per agent and that preference and priority weights are
+    nonnegative, raising ValueError on the first violation. Unlike assert,
+    this still runs under python -O.
+    """
+    for name, x, shape in (('Preferences', W, (n, m)), ('Priority weights', c, (n,)),
+                           ('Capacities', Q, (m,)), ('Minimums', mins, (n, m)),
+                           ('Ideals', ideals, (n, m))):
+        if x.shape != shape:
+            raise ValueError(f"{name} shape mismatch: {x.shape} vs {shape}")
+    # Utilities are modelled as nondecreasing in every allocation, and the
+    # problem's W and c parameters are declared nonnegative
+    for name, x in (('Preferences', W), ('Priority weights', c)):
+        if (x < 0).any():
+            raise ValueError(f"{name} must be nonnegative")
+    if len(utility_configs) != n:
+        raise ValueError(f"Utility configs length mismatch: {len(utility_configs)} vs {n}")
+
+
+def solve_joint_allocation(data):
+    """
+    Solve the joint multi-resource allocation problem with nonlinear utilities.
+    """
+    n = data['n_agents']
+    m = data['n_resources']
+    
+    # Extract matrices
+    W = as_float64(data['preferences'], (n, m))     # n x m preference weights
+    c = as_float64(data['priority_weights'])        # n priority weights
+    Q = as_float64(data['capacities'])              # m capacities
+    mins = as_float64(data['minimums'], (n, m))     # n x m minimums
+    ideals = as_float64(data['ideals'], (n, m))     # n x m ideals
+    
+    # Utility configurations, one per agent
+    utility_configs = read_utility_configs(data, n)
+    validate_inputs(n, m, W, c, Q, mins, ideals, utility_configs)
+    
+    # Get resource names for advanced utility types
+    resource_names = data.get('resource_names', [f'R{j}' for j in range(m)])
+    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
+    agents = parse_agent_configs(utility_configs, res_to_idx, m)
+    
+    # Check feasibility
+    min_totals = np.sum(mins, axis=0)
+    over_capacity = min_totals > Q
+    if over_capacity.any():
+        # Report the first overcommitted resource
+        j = int(np.argmax(over_capacity))
         return {
             "status": "infeasible",
-            "error": solve_error or f"Problem status: {problem.status}",
-            "allocations": mins.tolist(),
+            "error": f"Resource {j}: sum of minimums ({min_totals[j]}) exceeds capacity ({Q[j]})",
+            "allocations": mins,
             "objective": float('-inf'),
-            "solver": used_solver or "none"
+            "solver": "none"
         }
     
-    # Extract solution
-    allocations = A.value
-    utilities_val = u.value
+    # Ensure bounds are consistent
+    mins = np.minimum(mins, ideals)
+    
+    # Small epsilon for numerical stability
+    epsilon = 1e-6
+    
+    # A resource is pinned at the minimums when they use its whole capacity
+    # or every agent's minimum equals its ideal, and at the ideals when there
+    # is room for all of them (no utility decreases in an allocation). If
+    # every resource is pinned there is nothing to optimize. The tolerance is
+    # absolute: np.isclose's default rtol would pin a resource of capacity
+    # 1e6 with units still unallocated
+    at_mins = ((np.sum(mins, axis=0) >= Q - 1e-9)
+               | np.all(np.isclose(mins, ideals, rtol=0, atol=1e-9), axis=0))
+    at_ideals = np.sum(ideals, axis=0) <= Q
+    
+    all_linear = set(agents['groups']) <= {'LINEAR'}
+    solution = None
+    if np.all(at_mins | at_ideals):
+        allocations = np.where(at_mins, mins, ideals)
+        utilities = eval_utilities_np(W, allocations, agents)
+        # Only short-circuit what the solvers would accept: they reject
+        # non-DCP structures, and an agent with zero utility makes log(Φᵢ)
+        # infeasible. Otherwise fall through so the status matches
+        if np.all(utilities > 0) and (
+                all_linear or get_problem(n, m, utility_configs, res_to_idx, epsilon)["dcp"]):
+            solution = {
+                "status": "optimal",
+                "allocations": allocations,
+                "objective": log_welfare(c, utilities, epsilon),
+                "solver": "analytic",
+            }
+    if solution is None and CLARABEL_AVAILABLE and all_linear:
+        # Pure linear utilities: hand Clarabel the conic form directly
+        solution = solve_linear_fast(W, c, Q, mins, ideals, epsilon)
+    if solution is None:
+        solution = solve_with_cvxpy(n, m, utility_configs, res_to_idx,
+                                    W, c, Q, mins, ideals, epsilon)
+    
+    if solution["status"] != "optimal":
+        return {
+            "status": "infeasible",
+            "error": solution["error"],
+            "allocations": mins,
+            "objective": float('-inf'),
+            "solver": solution["solver"]
+        }
     
     # Ensure allocations are non-negative
-    allocations = np.maximum(allocations, 0)
+    allocations = np.maximum(solution["allocations"], 0)
     
     # Calculate actual utilities using numpy
-    actual_utilities = []
-    for i in range(n):
-        u_i = eval_utility_np(W[i, :], allocations[i, :], utility_configs[i], resource_names)
-        actual_utilities.append(u_i)
-    actual_utilities = np.array(actual_utilities)
+    actual_utilities = eval_utilities_np(W, allocations, agents)
     
     # Calculate welfare
-    welfare = np.sum(c * np.log(np.maximum(actual_utilities, epsilon)))
+    welfare = log_welfare(c, actual_utilities, epsilon)
     
     return {
         "status": "optimal",
-        "solver": used_solver,
-        "allocations": allocations.tolist(),
-        "objective": float(problem.value),
-        "utilities": actual_utilities.tolist(),
+        "solver": solution["solver"],
+        "allocations": allocations,
+        "objective": solution["objective"],
+        "utilities": actual_utilities,
         "welfare": float(welfare),
-        "utility_types": [
-            (cfg.get('type', 'LINEAR') if cfg else 'LINEAR')
-            for cfg in utility_configs
-        ]
+        "utility_types": agents['types'].tolist()
     }
 
 
@@ -823,120 +1422,280 @@ def solve_sequential_fallback(data):
     n = data['n_agents']
     m = data['n_resources']
     
-    W = np.array(data['preferences'])
-    c = np.array(data['priority_weights'])
-    Q = np.array(data['capacities'])
-    mins = np.array(data['minimums'])
-    ideals = np.array(data['ideals'])
+    W = as_float64(data['preferences'], (n, m))
+    c = as_float64(data['priority_weights'])
+    Q = as_float64(data['capacities'])
+    mins = as_float64(data['minimums'], (n, m))
+    ideals = as_float64(data['ideals'], (n, m))
+    utility_configs = read_utility_configs(data, n)
+    validate_inputs(n, m, W, c, Q, mins, ideals, utility_configs)
     
     resource_names = data.get('resource_names', [f'R{j}' for j in range(m)])
-    utility_configs = data.get('utility_configs', None)
+    res_to_idx = {name: idx for idx, name in enumerate(resource_names)}
     
-    allocations = np.zeros((n, m))
+    # One row per resource (the column-major layout of the n x m matrices),
+    # so each water-filling pass reads and writes contiguous buffers; the
+    # scratch arrays are shared by every pass
+    mins_by_resource = np.ascontiguousarray(mins.T)
+    ideals_by_resource = np.ascontiguousarray(ideals.T)
+    allocations_by_resource = np.empty((m, n))
+    workspace = water_filling_workspace(n)
     
     for j in range(m):
-        capacity = Q[j]
-        agent_mins = mins[:, j]
-        agent_ideals = ideals[:, j]
-        weights = c
-        
-        alloc = water_filling(weights, agent_mins, agent_ideals, capacity)
-        allocations[:, j] = alloc
+        water_filling(c, mins_by_resource[j], ideals_by_resource[j], Q[j],
+                      out=allocations_by_resource[j], workspace=workspace)
+    allocations = allocations_by_resource.T
     
     # Calculate utilities
-    utilities = []
-    for i in range(n):
-        cfg = utility_configs[i] if utility_configs else None
-        u_i = eval_utility_np(W[i, :], allocations[i, :], cfg, resource_names)
-        utilities.append(u_i)
-    utilities = np.array(utilities)
+    agents = parse_agent_configs(utility_configs, res_to_idx, m)
+    utilities = eval_utilities_np(W, allocations, agents)
     
     epsilon = 1e-8
+    # Unclamped, unlike log_welfare: a negative utility yields NaN welfare
     welfare = np.sum(c * np.log(utilities + epsilon))
     
     return {
         "status": "sequential_fallback",
         "solver": "water_filling",
-        "allocations": allocations.tolist(),
+        "allocations": allocations,
         "objective": float(welfare),
-        "utilities": utilities.tolist(),
+        "utilities": utilities,
         "welfare": float(welfare),
         "warning": "Using sequential optimization - LOCAL Pareto only"
     }
 
 
-def water_filling(weights, mins, ideals, capacity):
-    """Water-filling algorithm for single-resource allocation."""
+def water_filling(weights, mins, ideals, capacity, out=None, workspace=None):
+    """
+    Water-filling algorithm for single-resource allocation.
+    
+    Above its minimum each agent receives μ·wᵢ, capped at its ideal, for the
+    single water level μ that exhausts the capacity (agents with no weight
+    share any remainder equally). Agents saturate in increasing order of
+    their fill ratio slackᵢ/wᵢ, so one sort replaces iterating over
+    bottlenecks.
+    
+    The allocation is written into `out`; `workspace` holds the scratch
+    arrays (see water_filling_workspace). Both are allocated when omitted,
+    callers filling many resources pass them in to reuse across calls.
+    """
     n = len(weights)
-    alloc = mins.copy().astype(float)
+    if out is None:
+        out = np.empty(n)
+    if workspace is None:
+        workspace = water_filling_workspace(n)
+    return _water_filling_kernel(np.asarray(weights, dtype=np.float64),
+                                 np.asarray(mins, dtype=np.float64),
+                                 np.asarray(ideals, dtype=np.float64),
+                                 float(capacity), out, *workspace)
+
+
+def water_filling_workspace(n):
+    """Scratch arrays for water_filling: (frozen, active, share, ratios)."""
+    return (np.empty(n, dtype=np.bool_), np.empty(n, dtype=np.bool_),
+            np.empty(n), np.empty(n))
+
+
+def water_filling_np(weights, mins, ideals, capacity, alloc, frozen, active, share, ratios):
+    """
+    Vectorized NumPy water-filling, used when Numba is unavailable.
+    
+    With agents sorted by fill ratio rₖ = slackₖ/wₖ, the k-th saturates iff
+    filling every agent up to level rₖ fits in the remaining capacity:
+    Σ_{j<k} slackⱼ + rₖ·Σ_{j≥k} wⱼ ≤ remaining. This holds for a prefix
+    of the order, read off with two cumulative sums.
+    """
+    n = weights.shape[0]
+    alloc[:] = mins
     remaining = capacity - np.sum(mins)
     
     if remaining <= 0:
         return alloc
     
-    frozen = np.zeros(n, dtype=bool)
+    np.less(alloc, ideals, out=active)
+    np.subtract(ideals, alloc, out=share)
+    ratios.fill(np.inf)
+    np.divide(share, weights, out=ratios, where=active & (weights > 0))
+    
+    order = np.argsort(ratios)
+    slack_sorted = np.where(active, share, 0.0)[order]
+    weight_sorted = np.where(active, weights, 0.0)[order]
+    # Slack already filled and weight still unsaturated before the k-th agent.
+    # The total weight is the last cumulative sum rather than another pass
+    # ([-1:] keeps an empty agent list working)
+    filled = np.cumsum(slack_sorted) - slack_sorted
+    cum_weight = np.cumsum(weight_sorted)
+    weight_left = cum_weight[-1:] - cum_weight + weight_sorted
+    with np.errstate(invalid='ignore'):
+        saturates = (filled + ratios[order] * weight_left <= remaining) & (weight_left >= 1e-9)
+    k = n if saturates.all() else int(np.argmin(saturates))
+    
+    frozen[:] = False
+    frozen[order[:k]] = True
+    active[frozen] = False
+    alloc[frozen] = ideals[frozen]
+    remaining -= np.sum(slack_sorted[:k])
+    weight_rest = weight_left[k] if k < n else 0.0
+    
+    if weight_rest >= 1e-9:
+        # Everyone left sits below its ideal at the common water level
+        np.multiply(weights, remaining / weight_rest, out=share)
+        np.add(alloc, share, out=alloc, where=active)
+    else:
+        # Only weightless agents are left: split the remainder equally
+        n_active = np.count_nonzero(active)
+        if n_active > 0:
+            np.subtract(ideals, alloc, out=share)
+            np.minimum(share, remaining / n_active, out=share)
+            np.add(alloc, share, out=alloc, where=active)
+    
+    np.minimum(alloc, ideals, out=alloc)
+    np.maximum(alloc, mins, out=alloc)
+    return alloc
+
+
+# fastmath without 'nnan'/'ninf': the sweep relies on inf fill ratios for
+# weightless and inactive agents
+@lazy_njit(fallback=water_filling_np, cache=True,
+           fastmath={'reassoc', 'nsz', 'arcp', 'contract', 'afn'})
+def _water_filling_kernel(weights, mins, ideals, capacity, alloc, frozen, active, share, ratios):
+    """
+    Water-filling as scalar loops over float64 arrays, for Numba: saturate
+    agents in fill-ratio order while the remaining capacity covers raising
+    every unsaturated agent to the next ratio. Fills `alloc` in place;
+    share is only used by the NumPy fallback.
+    """
+    n = weights.shape[0]
+    alloc[:] = mins
+    remaining = capacity - np.sum(mins)
     
-    for _ in range(100):
-        active = ~frozen & (alloc < ideals)
-        if not np.any(active):
-            break
-        
-        active_weight = np.sum(weights[active])
-        if active_weight < 1e-9:
-            equal_share = remaining / np.sum(active)
-            for i in np.where(active)[0]:
-                slack = ideals[i] - alloc[i]
-                alloc[i] += min(equal_share, slack)
+    if remaining <= 0:
+        return alloc
+    
+    n_active = 0
+    weight_left = 0.0
+    for i in range(n):
+        frozen[i] = False
+        active[i] = alloc[i] < ideals[i]
+        ratios[i] = np.inf
+        if active[i]:
+            n_active += 1
+            weight_left += weights[i]
+            if weights[i] > 0:
+                ratios[i] = (ideals[i] - alloc[i]) / weights[i]
+    
+    for i in np.argsort(ratios):
+        if ratios[i] == np.inf or weight_left < 1e-9:
             break
-        
-        bottleneck_idx = -1
-        min_fill_ratio = float('inf')
-        
-        for i in np.where(active)[0]:
-            slack = ideals[i] - alloc[i]
-            share = (weights[i] / active_weight) * remaining
-            if share > slack:
-                fill_ratio = slack / share
-                if fill_ratio < min_fill_ratio:
-                    min_fill_ratio = fill_ratio
-                    bottleneck_idx = i
-        
-        if bottleneck_idx >= 0 and min_fill_ratio < 1.0:
-            to_distribute = remaining * min_fill_ratio
-            for i in np.where(active)[0]:
-                share = (weights[i] / active_weight) * to_distribute
-                alloc[i] += share
-            remaining -= to_distribute
-            alloc[bottleneck_idx] = ideals[bottleneck_idx]
-            frozen[bottleneck_idx] = True
-        else:
-            for i in np.where(active)[0]:
-                share = (weights[i] / active_weight) * remaining
-                alloc[i] += share
-            remaining = 0
+        if remaining < ratios[i] * weight_left:
             break
+        remaining -= ideals[i] - alloc[i]
+        weight_left -= weights[i]
+        alloc[i] = ideals[i]
+        frozen[i] = True
+        active[i] = False
+        n_active -= 1
+    
+    if weight_left >= 1e-9:
+        level = remaining / weight_left
+        for i in range(n):
+            if active[i]:
+                alloc[i] += weights[i] * level
+    elif n_active > 0:
+        equal_share = remaining / n_active
+        for i in range(n):
+            if active[i]:
+                alloc[i] += min(equal_share, ideals[i] - alloc[i])
     
-    alloc = np.maximum(mins, np.minimum(ideals, alloc))
+    for i in range(n):
+        alloc[i] = max(mins[i], min(ideals[i], alloc[i]))
     return alloc
 
 
+def load_request(raw):
+    """
+    Parse a request (str or bytes) with orjson when it is installed.
+    
+    orjson rejects the non-standard NaN/Infinity literals the stdlib parser
+    accepts, so such a request is handed on to json.loads.
+    """
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def dump_result(result):
+    """
+    Serialize a result dict to JSON bytes. Arrays are left as numpy arrays
+    by the solve routes: orjson writes them straight from their buffers,
+    the stdlib encoder converts them with tolist().
+    
+    orjson would write a non-finite float (the -inf objective of an
+    infeasible result) as null, which the Java side reads as 0, so those
+    results keep the stdlib encoder and its -Infinity.
+    """
+    finite = all(np.all(np.isfinite(value)) for value in result.values()
+                 if isinstance(value, (float, np.ndarray)))
+    if ORJSON_AVAILABLE and finite:
+        return orjson.dumps(result, default=np.ndarray.tolist,
+                            option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(result, default=np.ndarray.tolist).encode()
+
+
+def solve_request(data):
+    """Solve one parsed request with the best available route."""
+    if CVXPY_AVAILABLE:
+        try:
+            return solve_joint_allocation(data)
+        except ImportError:
+            # Only a failed deferred cvxpy import is handled here
+            if CVXPY_AVAILABLE:
+                raise
+    result = solve_sequential_fallback(data)
+    result["warning"] = "cvxpy not available - using sequential fallback"
+    return result
+
+
+def serve():
+    """
+    Daemon loop: one request per stdin line, one response per stdout line.
+    
+    A failed request is answered with its error object on stdout instead of
+    ending the process, so the caller's pipe stays in step.
+    """
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        try:
+            result = solve_request(load_request(line))
+        except json.JSONDecodeError as e:
+            result = {"error": f"Invalid JSON: {str(e)}"}
+        except Exception as e:
+            result = {"error": str(e), "type": type(e).__name__}
+        sys.stdout.buffer.write(dump_result(result) + b'\n')
+        sys.stdout.flush()
+
+
 def main():
     """Main entry point."""
+    if '--daemon' in sys.argv[1:]:
+        serve()
+        return
+    
     try:
-        input_data = sys.stdin.read()
+        input_data = sys.stdin.buffer.read()
         if not input_data.strip():
             print(json.dumps({"error": "No input provided"}), file=sys.stderr)
             sys.exit(1)
         
-        data = json.loads(input_data)
-        
-        if CVXPY_AVAILABLE:
-            result = solve_joint_allocation(data)
-        else:
-            result = solve_sequential_fallback(data)
-            result["warning"] = "cvxpy not available - using sequential fallback"
+        data = load_request(input_data)
+        result = solve_request(data)
         
-        print(json.dumps(result))
+        sys.stdout.buffer.write(dump_result(result) + b'\n')
+        sys.stdout.flush()
         
     except json.JSONDecodeError as e:
         print(json.dumps({"error": f"Invalid JSON: {str(e)}"}), file=sys.stderr)
@@ -0,0 +1,404 @@
+"""
+Regression tests for joint_solver.py.
+
+Expected welfare values come from the original single-solve implementation
+(fresh cp.Problem per request, utility variables u with u ≥ min_utility),
+so they pin the cached/DPP, native Clarabel and analytic routes to the
+results the solver produced before them. Run with `python -m pytest -q`.
+"""
+
+import numpy as np
+import pytest
+
+import joint_solver as js
+
+
+requires_cvxpy = pytest.mark.skipif(not js.CVXPY_AVAILABLE, reason="cvxpy not installed")
+requires_clarabel = pytest.mark.skipif(not js.CLARABEL_AVAILABLE, reason="clarabel not installed")
+
+RESOURCE_NAMES = ['R0', 'R1', 'R2']
+
+CONFIGS = {
+    'LINEAR': {'type': 'LINEAR'},
+    'SQRT': {'type': 'SQRT'},
+    'LOG': {'type': 'LOG'},
+    'COBB_DOUGLAS': {'type': 'COBB_DOUGLAS'},
+    'CES': {'type': 'CES', 'rho': 0.5},
+    'CESneg': {'type': 'CES', 'rho': -1.0},
+    'THRESHOLD': {'type': 'THRESHOLD', 'threshold': 10, 'sharpness': 0.5},
+    'SATIATION': {'type': 'SATIATION', 'max_utility': 100, 'saturation_param': 10},
+    'SATH': {'type': 'SATIATION', 'max_utility': 100, 'saturation_param': 10,
+             'hyperbolic': True},
+    'SOFTPLUS': {'type': 'SOFTPLUS_LOSS_AVERSION',
+                 'weights': {'R0': 0.5, 'R1': 0.3, 'R2': 0.2},
+                 'reference_points': {'R0': 10, 'R1': 5}, 'lambda': 2.0, 'tau': 1.0},
+    'NESTED': {'type': 'NESTED_CES', 'nests': [{'R0': 0.6, 'R1': 0.4}, {'R2': 1.0}],
+               'nest_rhos': [0.5, 0.0], 'nest_weights': [0.7, 0.3], 'outer_rho': 0.5},
+}
+
+
+def make_request(n, m, seed, tight=True, config=None):
+    """
+    Random instance: normalized preferences, integer minimums and ideals,
+    capacities at half (tight) or twice (loose) the total ideal demand.
+    With `config`, agents 0 and 2 use it and agents 1 and 3 are linear.
+    """
+    rng = np.random.default_rng(seed)
+    W = rng.uniform(0.1, 1.0, (n, m))
+    W /= W.sum(1, keepdims=True)
+    mins = rng.integers(0, 5, (n, m)).astype(float)
+    ideals = mins + rng.integers(5, 40, (n, m))
+    Q = ideals.sum(0) * (0.5 if tight else 2.0)
+    c = rng.uniform(0.5, 3.0, n)
+    data = {
+        'n_agents': n,
+        'n_resources': m,
+        'preferences': W.tolist(),
+        'priority_weights': c.tolist(),
+        'capacities': Q.tolist(),
+        'minimums': mins.tolist(),
+        'ideals': ideals.tolist(),
+        'resource_names': RESOURCE_NAMES[:m] if m <= 3 else [f'R{j}' for j in range(m)],
+    }
+    if config is not None:
+        data['utility_configs'] = [CONFIGS[config], CONFIGS['LINEAR'], CONFIGS[config], None]
+    return data
+
+
+def make_tight_request():
+    """Capacities equal to the sum of the minimums: every resource is pinned."""
+    data = make_request(3, 2, 6)
+    data['capacities'] = np.sum(data['minimums'], axis=0).tolist()
+    return data
+
+
+# (request, welfare reported by the original solver)
+BASELINE = {
+    'lin_small': (lambda: make_request(3, 2, 1), 13.4983511525057),
+    'lin_loose': (lambda: make_request(4, 3, 2, tight=False), 25.515106280242183),
+    'lin_big': (lambda: make_request(40, 6, 3), 201.85703726512997),
+    'tight': (make_tight_request, 5.314793945941704),
+    'mix_LINEAR': (lambda: make_request(4, 3, 16, config='LINEAR'), 16.706772154132764),
+    'mix_LOG': (lambda: make_request(4, 3, 13, config='LOG'), 17.077937427335353),
+    'mix_CESneg': (lambda: make_request(4, 3, 16, config='CESneg'), 13.766884857600866),
+    'mix_SATIATION': (lambda: make_request(4, 3, 19, config='SATIATION'), 30.019770267738068),
+    'mix_SOFTPLUS': (lambda: make_request(4, 3, 18, config='SOFTPLUS'), 17.754533615544048),
+}
+
+
+def check_feasible(data, allocations, tol=1e-5):
+    """Allocations within [min(mins, ideals), ideals] and under capacity."""
+    mins = np.minimum(data['minimums'], data['ideals'])
+    scale = max(1.0, float(np.max(data['capacities'])))
+    assert np.all(allocations >= mins - tol * scale)
+    assert np.all(allocations <= np.array(data['ideals']) + tol * scale)
+    assert np.all(allocations.sum(axis=0) <= np.array(data['capacities']) + tol * scale)
+
+
+# ============================================================================
+# Baseline Outputs
+# ============================================================================
+
+@requires_cvxpy
+@pytest.mark.parametrize('name', sorted(BASELINE))
+def test_matches_baseline_welfare(name):
+    make, welfare = BASELINE[name]
+    data = make()
+    result = js.solve_joint_allocation(data)
+
+    assert result['status'] == 'optimal'
+    assert result['welfare'] == pytest.approx(welfare, rel=1e-4)
+    check_feasible(data, result['allocations'])
+
+
+@requires_cvxpy
+def test_baseline_allocations():
+    result = js.solve_joint_allocation(make_request(3, 2, 1))
+    expected = [[9.0, 7.6372], [1.0, 23.8628], [31.0, 2.0]]
+
+    np.testing.assert_allclose(result['allocations'], expected, atol=0.05)
+
+
+def test_negative_weights_rejected():
+    data = make_request(3, 2, 1)
+    data['preferences'][0][1] = -0.5
+    with pytest.raises(ValueError, match="Preferences must be nonnegative"):
+        js.solve_joint_allocation(data)
+
+    data = make_request(3, 2, 1)
+    data['priority_weights'][2] = -1.0
+    with pytest.raises(ValueError, match="Priority weights must be nonnegative"):
+        js.solve_joint_allocation(data)
+
+
+# ============================================================================
+# Native Clarabel Route
+# ============================================================================
+
+def native_inputs(data):
+    return (np.array(data['preferences']), np.array(data['priority_weights']),
+            np.array(data['capacities']), np.array(data['minimums']),
+            np.array(data['ideals']))
+
+
+@requires_clarabel
+def test_native_route_is_used_for_linear_agents():
+    result = js.solve_joint_allocation(make_request(40, 6, 3))
+
+    assert result['solver'] == 'CLARABEL'
+
+
+@requires_cvxpy
+@requires_clarabel
+def test_native_matches_cvxpy():
+    data = make_request(3, 2, 1)
+    W, c, Q, mins, ideals = native_inputs(data)
+    native = js.solve_linear_fast(W, c, Q, mins, ideals)
+    configs = js.read_utility_configs(data, 3)
+    res_to_idx = {name: j for j, name in enumerate(data['resource_names'])}
+    reference = js.solve_with_cvxpy(3, 2, configs, res_to_idx, W, c, Q, mins, ideals)
+
+    np.testing.assert_allclose(native['allocations'], reference['allocations'], atol=0.05)
+    assert native['objective'] == pytest.approx(reference['objective'], rel=1e-5)
+
+
+@requires_clarabel
+def test_native_objective_is_welfare_of_allocations():
+    W, c, Q, mins, ideals = native_inputs(make_request(40, 6, 3))
+    solution = js.solve_linear_fast(W, c, Q, mins, ideals)
+    utilities = np.sum(W * solution['allocations'], axis=1)
+
+    assert solution['objective'] == pytest.approx(js.log_welfare(c, utilities, 1e-6), rel=1e-12)
+
+
+@requires_clarabel
+def test_native_solver_reused_across_requests(monkeypatch):
+    monkeypatch.setattr(js, 'WARM_START', True)
+    js._LINEAR_SOLVER_CACHE.clear()
+    first = native_inputs(make_request(3, 2, 1))
+    second = native_inputs(make_request(3, 2, 21))
+
+    js.solve_linear_fast(*first)
+    solver = js._LINEAR_SOLVER_CACHE[(3, 2)]
+    warm = js.solve_linear_fast(*second)
+    assert js._LINEAR_SOLVER_CACHE[(3, 2)] is solver
+
+    js._LINEAR_SOLVER_CACHE.clear()
+    cold = js.solve_linear_fast(*second)
+    np.testing.assert_allclose(warm['allocations'], cold['allocations'], atol=1e-4)
+    assert warm['objective'] == pytest.approx(cold['objective'], rel=1e-6)
+
+
+# ============================================================================
+# Problem Cache and DPP Forms
+# ============================================================================
+
+@requires_cvxpy
+def test_problem_cache_and_warm_resolve():
+    js._PROBLEM_CACHE.clear()
+    first = make_request(4, 3, 13, config='SQRT')
+    second = make_request(4, 3, 31, config='SQRT')
+
+    js.solve_joint_allocation(first)
+    assert len(js._PROBLEM_CACHE) == 1
+    entry = next(iter(js._PROBLEM_CACHE.values()))
+    warm = js.solve_joint_allocation(second)
+    assert len(js._PROBLEM_CACHE) == 1
+    assert next(iter(js._PROBLEM_CACHE.values())) is entry
+
+    js._PROBLEM_CACHE.clear()
+    cold = js.solve_joint_allocation(second)
+    np.testing.assert_allclose(warm['allocations'], cold['allocations'], atol=1e-2)
+    assert warm['welfare'] == pytest.approx(cold['welfare'], rel=1e-6)
+
+
+@requires_cvxpy
+@pytest.mark.parametrize('config', ['SQRT', 'COBB_DOUGLAS', 'CES', 'THRESHOLD', 'SATH'])
+def test_dpp_forms(config):
+    data = make_request(4, 3, 10 + len(config), config=config)
+    configs = js.read_utility_configs(data, 4)
+    res_to_idx = {name: j for j, name in enumerate(data['resource_names'])}
+    entry = js.get_problem(4, 3, configs, res_to_idx)
+
+    assert entry['dcp']
+    assert entry['dpp']
+
+    result = js.solve_joint_allocation(data)
+    assert result['status'] == 'optimal'
+    check_feasible(data, result['allocations'])
+    # The epigraph is tight at the optimum, so the conic objective Σ cᵢ·tᵢ
+    # must equal the welfare of the numpy utilities: the DPP form models
+    # the same Φᵢ as eval_utilities_np
+    assert result['objective'] == pytest.approx(result['welfare'], rel=1e-4)
+
+
+# ============================================================================
+# Analytic Shortcut
+# ============================================================================
+
+def test_analytic_at_ideals():
+    data = make_request(4, 3, 2, tight=False)
+    result = js.solve_joint_allocation(data)
+
+    assert result['solver'] == 'analytic'
+    np.testing.assert_array_equal(result['allocations'], data['ideals'])
+
+
+def test_analytic_at_minimums():
+    data = make_tight_request()
+    result = js.solve_joint_allocation(data)
+
+    assert result['solver'] == 'analytic'
+    np.testing.assert_array_equal(result['allocations'], data['minimums'])
+
+
+@requires_cvxpy
+def test_analytic_skips_non_dcp_structures():
+    data = make_request(4, 3, 7, tight=False)
+    data['utility_configs'] = [CONFIGS['NESTED'], None, None, None]
+    result = js.solve_joint_allocation(data)
+
+    assert result['status'] == 'infeasible'
+    assert 'DCP' in result['error']
+
+
+@requires_cvxpy
+def test_analytic_skips_zero_utility():
+    data = make_request(3, 2, 1, tight=False)
+    data['preferences'][0] = [0.0, 0.0]
+    result = js.solve_joint_allocation(data)
+
+    # Left to the solvers, which cannot make log(Φ₀) finite
+    assert result['solver'] != 'analytic'
+
+
+@requires_cvxpy
+def test_pinned_tolerance_is_absolute():
+    # Within np.isclose's default rtol of the capacity, but 5 units remain
+    data = {
+        'n_agents': 2,
+        'n_resources': 1,
+        'preferences': [[1.0], [1.0]],
+        'priority_weights': [1.0, 1.0],
+        'capacities': [1e6],
+        'minimums': [[499995.0], [500000.0]],
+        'ideals': [[6e5], [6e5]],
+    }
+    result = js.solve_joint_allocation(data)
+
+    assert result['solver'] != 'analytic'
+    assert result['allocations'].sum() > 999995.0 + 2.0
+
+
+# ============================================================================
+# Large-Scale Minimum Utility
+# ============================================================================
+
+@requires_cvxpy
+@pytest.mark.parametrize('configs', [None, [CONFIGS['SQRT'], CONFIGS['LINEAR']]])
+def test_nearly_active_minimums_solve_with_clarabel(configs):
+    data = {
+        'n_agents': 2,
+        'n_resources': 1,
+        'preferences': [[1.0], [1.0]],
+        'priority_weights': [1.0, 1.0],
+        'capacities': [1e6],
+        'minimums': [[499990.0], [499995.0]],
+        'ideals': [[6e5], [6e5]],
+    }
+    if configs is not None:
+        data['utility_configs'] = configs
+    result = js.solve_joint_allocation(data)
+
+    assert result['status'] == 'optimal'
+    assert result['solver'] == 'CLARABEL'
+    check_feasible(data, result['allocations'])
+    assert result['allocations'].sum() == pytest.approx(1e6, abs=5.0)
+
+
+# ============================================================================
+# Water-Filling
+# ============================================================================
+
+def reference_water_filling(weights, mins, ideals, capacity):
+    """The original bottleneck loop the sorted kernels replaced."""
+    n = len(weights)
+    alloc = mins.astype(float).copy()
+    remaining = capacity - np.sum(mins)
+
+    if remaining <= 0:
+        return alloc
+
+    frozen = np.zeros(n, dtype=bool)
+    for _ in range(100):
+        active = ~frozen & (alloc < ideals)
+        if not np.any(active):
+            break
+
+        active_weight = np.sum(weights[active])
+        if active_weight < 1e-9:
+            equal_share = remaining / np.sum(active)
+            for i in np.where(active)[0]:
+                alloc[i] += min(equal_share, ideals[i] - alloc[i])
+            break
+
+        bottleneck_idx = -1
+        min_fill_ratio = float('inf')
+        for i in np.where(active)[0]:
+            slack = ideals[i] - alloc[i]
+            share = (weights[i] / active_weight) * remaining
+            if share > slack and slack / share < min_fill_ratio:
+                min_fill_ratio = slack / share
+                bottleneck_idx = i
+
+        if bottleneck_idx >= 0 and min_fill_ratio < 1.0:
+            to_distribute = remaining * min_fill_ratio
+            for i in np.where(active)[0]:
+                alloc[i] += (weights[i] / active_weight) * to_distribute
+            remaining -= to_distribute
+            alloc[bottleneck_idx] = ideals[bottleneck_idx]
+            frozen[bottleneck_idx] = True
+        else:
+            for i in np.where(active)[0]:
+                alloc[i] += (weights[i] / active_weight) * remaining
+            break
+
+    return alloc
+
+
+def water_filling_instances():
+    rng = np.random.default_rng(5)
+    for n in (1, 2, 7, 50):
+        for fill in (0.3, 0.9, 1.5):
+            weights = rng.uniform(0.1, 3.0, n)
+            if n > 2:
+                weights[:2] = 0.0
+            mins = rng.integers(0, 5, n).astype(float)
+            ideals = mins + rng.integers(0, 20, n)
+            yield weights, mins, ideals, float(np.sum(mins) + fill * np.sum(ideals - mins))
+
+
+@pytest.mark.parametrize('kernel', ['water_filling', 'water_filling_np', 'python'])
+def test_water_filling_matches_reference(kernel):
+    for weights, mins, ideals, capacity in water_filling_instances():
+        expected = reference_water_filling(weights, mins, ideals, capacity)
+        if kernel == 'water_filling':
+            # Numba-compiled when numba is installed
+            alloc = js.water_filling(weights, mins, ideals, capacity)
+        else:
+            func = (js.water_filling_np if kernel == 'water_filling_np'
+                    else js._water_filling_kernel.__wrapped__)
+            alloc = func(weights, mins, ideals, capacity, np.empty(len(weights)),
+                         *js.water_filling_workspace(len(weights)))
+
+        np.testing.assert_allclose(alloc, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_sequential_fallback_fills_each_resource():
+    data = make_request(4, 3, 2)
+    result = js.solve_sequential_fallback(data)
+    Q = np.array(data['capacities'])
+
+    assert result['status'] == 'sequential_fallback'
+    check_feasible(data, result['allocations'])
+    np.testing.assert_allclose(result['allocations'].sum(axis=0), Q)